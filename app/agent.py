@@ -1,13 +1,38 @@
-from dataclasses import dataclass
+import asyncio
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import cache
 from pydantic import BaseModel, Field
+from pydantic_core import from_json
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from pydantic_ai.messages import ModelMessagesTypeAdapter, ModelResponse, ToolCallPart
+from pydantic_ai.models import Model
+from pydantic_ai.models.wrapper import WrapperModel
 from app.config import settings
+from app.cache import embedding_cache, response_cache
+from app.limiter import chat_limiter, embedding_limiter, estimate_tokens
+from app.metrics import record_agent_run, track_stage
 from app.database import DataconnectionUser, DataconnectionFaq
-from openai import AsyncOpenAI
+from app.intents import intent_router
+from app.models import QueryRequest, QueryResponse
+from app.sessions import load_history, save_history
 
-embedding_client = AsyncOpenAI(api_key=settings.openai_api_key)
+
+@cache
+def openai_client():
+   """
+   Shared OpenAI client, created on first use: importing the openai package is a large part of cold-start time.
+   Retries are handled by the upstream limiters, which also apply backoff and budgets.
+   """
+   
+   from openai import AsyncOpenAI
+   
+   return AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None, max_retries=0)
+
+# Request reduced-size embeddings where the model supports it; cache keys include the size so sizes never mix
+embedding_options = {"dimensions": settings.embedding_dimensions} if settings.embedding_dimensions_supported else {}
+embedding_model_id = ":".join([settings.openai_embedding_model_name, *map(str, embedding_options.values())])
 
 @dataclass
 class SupportDependencies:
@@ -16,6 +41,48 @@ class SupportDependencies:
    user_id: int
    db: DataconnectionUser
    faqdb: DataconnectionFaq = None
+   _user_profile: asyncio.Future | None = field(default=None, init=False, repr=False)
+   _faq_context: asyncio.Future | None = field(default=None, init=False, repr=False)
+
+   def prefetch_user_profile(self) -> asyncio.Future:
+      """Start loading the user's profile row, at most once per agent run."""
+      
+      if self._user_profile is None:
+         self._user_profile = asyncio.ensure_future(self.db.user_profile(self.user_id))
+      return self._user_profile
+
+   async def user_profile(self) -> dict | None:
+      """Return the memoized user profile, loading it on first use."""
+      
+      return await self.prefetch_user_profile()
+
+   def use_user_profile(self, profile: dict | None):
+      """Use an already loaded user profile, e.g. one fetched for a whole batch of queries."""
+      
+      self._user_profile = asyncio.get_running_loop().create_future()
+      self._user_profile.set_result(profile)
+
+   def prefetch_faq_context(self, query: str, query_embedding: list[float] = None) -> asyncio.Future:
+      """Start retrieving the top FAQ entries for the query (pre-retrieval mode), at most once per agent run."""
+      
+      if self._faq_context is None:
+         self._faq_context = asyncio.ensure_future(self._retrieve_faqs(query, query_embedding))
+      return self._faq_context
+
+   async def _retrieve_faqs(self, query: str, query_embedding: list[float] = None) -> list[dict]:
+      embedding = query_embedding if query_embedding is not None else await generate_embedding(query)
+      return await self.faqdb.search(query, embedding, limit=settings.faq_preretrieval_top_k)
+
+   async def faq_context(self) -> list[dict]:
+      """Return the pre-retrieved FAQ entries, or an empty list when pre-retrieval isn't used for this run."""
+      
+      return await self._faq_context if self._faq_context is not None else []
+
+   def cancel_faq_context(self):
+      """Drop a pre-retrieval that is no longer needed, e.g. when the response was served from cache."""
+      
+      if self._faq_context is not None:
+         self._faq_context.cancel()
 
 
 class SupportResult(BaseModel):
@@ -26,10 +93,50 @@ class SupportResult(BaseModel):
    risk_level: int = Field(description="Risk level of the query", ge=0, le=10)
 
 
-model = OpenAIModel(
-   model_name=settings.openai_model,
-   provider=OpenAIProvider(api_key=settings.openai_api_key),
-)
+class LimitedModel(WrapperModel):
+   """Model wrapper that routes every request through the chat limiter. The wrapped model is built on first use."""
+   
+   def __init__(self, factory: Callable[[], Model]):
+      self._factory = factory
+      self._wrapped = None
+   
+   @property
+   def wrapped(self) -> Model:
+      if self._wrapped is None:
+         self._wrapped = self._factory()
+      return self._wrapped
+   
+   async def request(self, messages, model_settings, model_request_parameters) -> ModelResponse:
+      with track_stage("model"):
+         return await chat_limiter.call(
+            self.wrapped.request, messages, model_settings, model_request_parameters,
+            tokens=estimate_tokens(ModelMessagesTypeAdapter.dump_json(messages).decode())
+         )
+   
+   @asynccontextmanager
+   async def request_stream(self, messages, model_settings, model_request_parameters):
+      with track_stage("model"):
+         async with chat_limiter.slot(tokens=estimate_tokens(ModelMessagesTypeAdapter.dump_json(messages).decode())):
+            async with self.wrapped.request_stream(messages, model_settings, model_request_parameters) as response_stream:
+               yield response_stream
+
+
+def openai_model() -> Model:
+   """Build the OpenAI chat model; its modules are only imported when the model is first needed."""
+   
+   from pydantic_ai.models.openai import OpenAIModel
+   from pydantic_ai.providers.openai import OpenAIProvider
+   
+   return OpenAIModel(model_name=settings.openai_model, provider=OpenAIProvider(openai_client=openai_client()))
+
+
+model = LimitedModel(openai_model)
+
+
+def warm_up_model():
+   """Build the OpenAI model and client ahead of the first query, e.g. in a worker thread after startup."""
+   
+   return model.wrapped
 
 
 support_agent = Agent(
@@ -50,20 +157,115 @@ support_agent = Agent(
 )
 
 
+async def request_embeddings(texts: list[str]) -> list[list[float]]:
+   """Embed several texts with a single multi-input call to OpenAI's embedding API."""
+   
+   with track_stage("embedding"):
+      response = await embedding_limiter.call(
+         openai_client().embeddings.create,
+         model=settings.openai_embedding_model_name, input=texts, **embedding_options,
+         tokens=sum(estimate_tokens(text) for text in texts)
+      )
+   embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+   # Models without a `dimensions` parameter that the settings check doesn't know would otherwise fail on every insert
+   if embeddings and len(embeddings[0]) != settings.embedding_dimensions:
+      raise ValueError(
+         f"{settings.openai_embedding_model_name} returned {len(embeddings[0])}-dimensional embeddings, "
+         f"but EMBEDDING_DIMENSIONS is {settings.embedding_dimensions}"
+      )
+   return embeddings
+
+
+class EmbeddingBatcher:
+   """Coalesce concurrent single-text embedding requests into multi-input API calls."""
+   
+   def __init__(self, max_wait_ms: float, max_batch_size: int):
+      self.max_wait = max_wait_ms / 1000
+      self.max_batch_size = max_batch_size
+      self._pending: list[tuple[str, asyncio.Future]] = []
+      self._timer: asyncio.TimerHandle | None = None
+      self._tasks: set[asyncio.Task] = set()
+   
+   async def embed(self, text: str) -> list[float]:
+      """Queue a text for the next batch and wait for its embedding."""
+      
+      loop = asyncio.get_running_loop()
+      future = loop.create_future()
+      self._pending.append((text, future))
+      if len(self._pending) >= self.max_batch_size:
+         self._flush()
+      elif self._timer is None:
+         self._timer = loop.call_later(self.max_wait, self._flush)
+      return await future
+   
+   def _flush(self):
+      if self._timer:
+         self._timer.cancel()
+         self._timer = None
+      batch, self._pending = self._pending, []
+      if batch:
+         task = asyncio.ensure_future(self._send(batch))
+         self._tasks.add(task)
+         task.add_done_callback(self._tasks.discard)
+   
+   async def _send(self, batch: list[tuple[str, asyncio.Future]]):
+      texts = list(dict.fromkeys(text for text, _ in batch))
+      try:
+         embeddings = dict(zip(texts, await request_embeddings(texts)))
+      except Exception as e:
+         for _, future in batch:
+            if not future.done():
+               future.set_exception(e)
+      else:
+         for text, future in batch:
+            if not future.done():
+               future.set_result(embeddings[text])
+
+
+embedding_batcher = EmbeddingBatcher(settings.embedding_batch_window_ms, settings.embedding_batch_size)
+
+
 async def generate_embedding(text: str) -> list[float]:
-   """Generate an embedding for the given text using OpenAI's embedding model."""
+   """Generate an embedding for the given text using OpenAI's embedding model, served from cache when possible."""
    
-   response = await embedding_client.embeddings.create(
-      model=settings.openai_embedding_model_name, input=text
-   )
-   return response.data[0].embedding
+   key = embedding_cache.key(text, embedding_model_id)
+   cached = await embedding_cache.get(key)
+   if cached is not None:
+      return cached
+   
+   if settings.embedding_batch_window_ms > 0:
+      embedding = await embedding_batcher.embed(text)
+   else:
+      embedding = (await request_embeddings([text]))[0]
+   await embedding_cache.set(key, embedding)
+   return embedding
+
+
+async def generate_embeddings(texts: list[str], cache: bool = True) -> list[list[float]]:
+   """
+   Generate embeddings for many texts, sending cache misses in batches of `embedding_batch_size`.
+   Bulk document loads pass cache=False so they don't evict cached query embeddings.
+   """
+   
+   keys = [embedding_cache.key(text, embedding_model_id) for text in texts]
+   embeddings = [await embedding_cache.get(key) for key in keys] if cache else [None] * len(texts)
+   missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+   
+   for start in range(0, len(missing), settings.embedding_batch_size):
+      chunk = missing[start:start + settings.embedding_batch_size]
+      for i, embedding in zip(chunk, await request_embeddings([texts[i] for i in chunk])):
+         embeddings[i] = embedding
+         if cache:
+            await embedding_cache.set(keys[i], embedding)
+   return embeddings
 
 
 @support_agent.system_prompt
 async def add_user_name(ctx: RunContext[SupportDependencies]) -> str:
    """Add the user's name to the context for personalized responses."""
    
-   user_name = await ctx.deps.db.user_name(ctx.deps.user_id)
+   profile = await ctx.deps.user_profile()
+   user_name = profile["name"] if profile else "User not found"
    return f"User name is {user_name!r}.\n\n"
 
 
@@ -72,8 +274,29 @@ async def example_faq_usage(_: RunContext[SupportDependencies]) -> str:
    """Provide an example of how to use the `faq_search` tool in the context of customer support."""
    
    return (
-      "Example: If the user asks about refunds, you can use `faq_search('refund policy')` "
-      "to retrieve relevant documentation from the FAQ database.\n"
+      "Example: If the user asks about refunds, you can use `faq_search(['refund policy'])` "
+      "to retrieve relevant documentation from the FAQ database. If a question covers several topics, search them "
+      "all in one call, e.g. `faq_search(['refund policy', 'cancel subscription'])`.\n"
+   )
+
+
+@support_agent.system_prompt(dynamic=True)
+async def add_retrieved_faqs(ctx: RunContext[SupportDependencies]) -> str:
+   """
+   Inject the FAQ entries retrieved before the run in pre-retrieval mode, so most answers need no `faq_search`
+   round-trip. Dynamic, so each turn of a conversation gets the entries for its own question.
+   """
+   
+   try:
+      rows = await ctx.deps.faq_context()
+   except Exception as e:
+      print(f"Warning: FAQ pre-retrieval failed, the agent can still use faq_search: {e}")
+      return ""
+   if not rows:
+      return ""
+   return (
+      "FAQ entries retrieved for the user's question:\n\n" + format_faq_results(rows) + "\n\n"
+      "Answer from these entries when they cover the question; only call `faq_search` for information they don't include.\n"
    )
 
 
@@ -81,7 +304,8 @@ async def example_faq_usage(_: RunContext[SupportDependencies]) -> str:
 async def check_account_status(ctx: RunContext[SupportDependencies]) -> str:
    """Check the user's account status and return it."""
    
-   account_status = await ctx.deps.db.account_status(ctx.deps.user_id)
+   profile = await ctx.deps.user_profile()
+   account_status = profile["account_status"] if profile else "User not found"
    return f"User account status is {account_status!r}.\n\n"
 
 
@@ -89,10 +313,27 @@ async def check_account_status(ctx: RunContext[SupportDependencies]) -> str:
 async def check_subscription_plan(ctx: RunContext[SupportDependencies]) -> str:
    """Check the user's subscription plan and return it."""
    
-   subscription_plan = await ctx.deps.db.subscription_plan(ctx.deps.user_id)
+   profile = await ctx.deps.user_profile()
+   subscription_plan = profile["subscription_plan"] if profile else "User not found"
    return f"User subscription plan is {subscription_plan!r}.\n\n"
 
 
+def partial_support_advice(message: ModelResponse) -> str:
+   """Extract the `support_advice` text streamed so far from a partial structured response."""
+   
+   for part in message.parts:
+      if isinstance(part, ToolCallPart):
+         args = part.args
+         if isinstance(args, str):
+            try:
+               args = from_json(args, allow_partial='trailing-strings') if args else {}
+            except ValueError:
+               continue
+         if isinstance(args, dict) and isinstance(args.get("support_advice"), str):
+            return args["support_advice"]
+   return ""
+
+
 def format_faq_results(rows) -> str:
    """Format the FAQ search results into a readable string."""
    
@@ -102,10 +343,144 @@ def format_faq_results(rows) -> str:
    )
 
 
+def merge_faq_results(result_sets: list[list[dict]]) -> list[dict]:
+   """Merge ranked result lists round-robin, so each sub-query's best match comes first, dropping repeated FAQs."""
+   
+   merged = {}
+   for rank in range(max((len(rows) for rows in result_sets), default=0)):
+      for rows in result_sets:
+         if rank < len(rows):
+            merged.setdefault(rows[rank]["id"], rows[rank])
+   return list(merged.values())
+
+
+# Upper bound on sub-queries per faq_search call, each costing one concurrent search
+FAQ_SEARCH_MAX_QUERIES = 5
+
+
 @support_agent.tool
-async def faq_search(ctx: RunContext[SupportDependencies], query: str, top_k=2) -> str:
-   """Search the FAQ database for relevant entries based on the user's query."""
+async def faq_search(ctx: RunContext[SupportDependencies], queries: list[str], top_k=2, category: str | None = None) -> str:
+   """
+   Search the FAQ database for relevant entries. Pass one sub-query per topic of the user's question,
+   e.g. ['refund policy', 'cancel subscription'], and they are searched together.
+   Pass `category` ('billing', 'technical' or 'general') to only search FAQs in that category.
+   """
+   
+   queries = list(dict.fromkeys(query for query in queries if query.strip()))[:FAQ_SEARCH_MAX_QUERIES]
+   if not queries:
+      return ""
+   # One embeddings request for all sub-queries, then the searches run concurrently
+   embeddings = await generate_embeddings(queries)
+   result_sets = await asyncio.gather(
+      *(ctx.deps.faqdb.search(query, embedding, limit=top_k, category=category) for query, embedding in zip(queries, embeddings))
+   )
+   return format_faq_results(merge_faq_results(result_sets))
+
+
+def use_preretrieval(request: QueryRequest) -> bool:
+   """Whether to retrieve FAQs before the agent run: the request's `preretrieval` flag, else the configured default."""
+   
+   return request.preretrieval if request.preretrieval is not None else settings.faq_preretrieval
+
+
+def uses_query_embedding(request: QueryRequest) -> bool:
+   """Whether run_support_query embeds the query before the agent run: response cache, embedding fast path or pre-retrieval."""
+   
+   if not request.session_id and (settings.response_cache_enabled or settings.fast_path_mode == "embedding"):
+      return True
+   return use_preretrieval(request)
+
+
+@dataclass
+class PreparedQuery:
+   """Outcome of the steps before an agent run, carried over to the steps after it."""
+   
+   response: QueryResponse | None = None  # Set when the query was answered without the model
+   cache_status: str | None = None  # 'HIT', 'MISS', or None when the response cache wasn't used
+   history: list = field(default_factory=list)
+   cache_context: tuple | None = None
+   query_embedding: list[float] | None = None
+   knowledge_version: int | None = None
+
+
+async def prepare_support_query(
+   request: QueryRequest, deps: SupportDependencies, query_embedding: list[float] = None
+) -> PreparedQuery:
+   """
+   Run the steps shared by the plain and streaming endpoints before the agent runs. Deterministic account questions
+   are answered by the intent router without the model, and near-duplicates are served from the semantic response
+   cache when it is enabled. Queries with a session_id continue that conversation instead and bypass both, since their
+   answer depends on earlier turns. In pre-retrieval mode the FAQ search runs while the history, cache lookup and user
+   profile are loaded.
+   """
+   
+   if settings.fast_path_mode != "off" and not request.session_id:
+      fast_response = await intent_router.answer(request, await deps.user_profile(), query_embedding)
+      if fast_response:
+         return PreparedQuery(response=fast_response)
+   
+   if use_preretrieval(request):
+      deps.prefetch_faq_context(request.query, query_embedding)
+   
+   prepared = PreparedQuery(query_embedding=query_embedding)
+   if request.session_id:
+      prepared.history = await load_history(request.session_id, request.user_id)
+   
+   if settings.response_cache_enabled and not request.session_id:
+      # Answers are personalized (the user's name is in the prompt), so they are only reused for the same user
+      profile = await deps.user_profile()
+      prepared.cache_context = (request.user_id, profile["subscription_plan"], profile["account_status"]) if profile else (request.user_id, None, None)
+      if prepared.query_embedding is None:
+         prepared.query_embedding = await generate_embedding(request.query)
+      prepared.knowledge_version = await deps.faqdb.knowledge_version()
+      cached = response_cache.lookup(prepared.query_embedding, prepared.cache_context, prepared.knowledge_version)
+      if cached:
+         deps.cancel_faq_context()
+         prepared.response = QueryResponse(user_id=request.user_id, query=request.query, **cached)
+         prepared.cache_status = "HIT"
+      else:
+         prepared.cache_status = "MISS"
+   
+   return prepared
+
+
+async def finish_support_query(
+   request: QueryRequest, prepared: PreparedQuery, output: SupportResult, messages: list
+) -> QueryResponse:
+   """Cache the agent's answer and save the conversation, then build the response."""
+   
+   if prepared.cache_context is not None:
+      response_cache.store(prepared.query_embedding, prepared.cache_context, output.model_dump(), prepared.knowledge_version)
+   if request.session_id:
+      await save_history(request.session_id, request.user_id, messages)
+   
+   return QueryResponse(
+      user_id=request.user_id,
+      query=request.query,
+      support_advice=output.support_advice,
+      escalation_required=output.escalation_required,
+      risk_level=output.risk_level,
+      session_id=request.session_id
+   )
+
+
+async def run_support_query(
+   request: QueryRequest, deps: SupportDependencies, query_embedding: list[float] = None
+) -> tuple[QueryResponse, str | None]:
+   """
+   Answer one support query, from the fast path or response cache when possible (see prepare_support_query).
+   Returns the response and the cache outcome ('HIT', 'MISS', or None).
+   """
+   
+   prepared = await prepare_support_query(request, deps, query_embedding)
+   if prepared.response:
+      return prepared.response, prepared.cache_status
+   
+   with track_stage("agent_run"):
+      result = await support_agent.run(request.query, deps=deps, message_history=prepared.history or None)
+   record_agent_run(result)
+   
+   if not result or not result.output:
+      raise RuntimeError("No response from support agent")
    
-   embedding = await generate_embedding(query)
-   rows = await ctx.deps.faqdb.search_by_embedding(embedding, limit=top_k)
-   return format_faq_results(rows)
+   return await finish_support_query(request, prepared, result.output, result.all_messages()), prepared.cache_status
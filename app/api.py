@@ -1,7 +1,23 @@
-from fastapi import APIRouter, HTTPException
-from app.agent import support_agent, SupportDependencies, generate_embedding
-from app.database import DataconnectionFaq, DataconnectionUser
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+from fastapi import APIRouter, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from app.agent import (
+    support_agent, SupportDependencies, finish_support_query, generate_embeddings, partial_support_advice,
+    prepare_support_query, run_support_query
+)
+from app.batch import batch_jobs
+from app.cache import response_cache
+from app.config import settings
+from app.database import DataconnectionFaq, DataconnectionUser, DuplicateFaq
+from app.ingest import import_faqs, iter_faq_records, reembedding_worker
+from app.limiter import UpstreamOverloaded
+from app.metrics import record_agent_run, track_stage
 from app.models import (
+    BatchQueryRequest,
     QueryRequest,
     QueryResponse,
     FaqCreateRequest
@@ -22,17 +38,28 @@ agent_router = APIRouter(
 )
 
 
+admin_router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    responses={500: {"description": "Internal server error"}}
+)
+
+
 @agent_router.post(
     "/query", 
     response_model=QueryResponse,
     summary="Process Customer Support Query",
     description="Submit a customer support query to the AI agent for intelligent response generation",
     responses={
-        200: {"description": "Successful query processing with AI response"},
-        500: {"description": "Error processing query"}
+        200: {
+            "description": "Successful query processing with AI response",
+            "headers": {"X-Cache": {"description": "HIT when served from the semantic response cache, otherwise MISS"}}
+        },
+        500: {"description": "Error processing query"},
+        503: {"description": "Upstream model capacity exhausted, retry after the `Retry-After` delay"}
     }
 )
-async def query_support_agent(request: QueryRequest):
+async def query_support_agent(request: QueryRequest, response: Response):
     """
 Process a customer support query using AI agent with RAG capabilities.
     """
@@ -42,45 +69,196 @@ Process a customer support query using AI agent with RAG capabilities.
             db=DataconnectionUser(),
             faqdb=DataconnectionFaq()
         )
+        deps.prefetch_user_profile()
 
-        result = await support_agent.run(request.query, deps=deps)
-        
-        if not result or not result.output:
-            raise HTTPException(status_code=500, detail="No response from support agent")
-        
-        return QueryResponse(
-            user_id=request.user_id,
-            query=request.query,
-            support_advice=result.output.support_advice,
-            escalation_required=result.output.escalation_required,
-            risk_level=result.output.risk_level
-        )
+        query_response, cache_status = await run_support_query(request, deps)
+        if cache_status:
+            response.headers["X-Cache"] = cache_status
+        return query_response
     
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 
+@agent_router.post(
+    "/query/stream",
+    summary="Stream Customer Support Query",
+    description="Submit a customer support query and stream the AI agent's advice as newline-delimited JSON events",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "`delta` events carrying new `support_advice` text, then one `result` event with the full response",
+            "content": {"application/x-ndjson": {}}
+        }
+    }
+)
+async def stream_support_agent(request: QueryRequest):
+    """
+Stream a customer support query response as NDJSON events.
+    """
+    deps = SupportDependencies(
+        user_id=request.user_id,
+        db=DataconnectionUser(),
+        faqdb=DataconnectionFaq()
+    )
+    deps.prefetch_user_profile()
+
+    async def events():
+        sent = ""
+        output = None
+        try:
+            prepared = await prepare_support_query(request, deps)
+            if prepared.response:
+                yield json.dumps({"type": "delta", "support_advice": prepared.response.support_advice}) + "\n"
+                yield json.dumps({"type": "result", **prepared.response.model_dump()}) + "\n"
+                return
+            
+            with track_stage("agent_run"):
+                async with support_agent.run_stream(request.query, deps=deps, message_history=prepared.history or None) as result:
+                    async for message, is_last in result.stream_structured(debounce_by=0.05):
+                        if is_last:
+                            output = await result.validate_structured_output(message)
+                            advice = output.support_advice
+                        else:
+                            advice = partial_support_advice(message)
+                        
+                        if advice.startswith(sent) and len(advice) > len(sent):
+                            yield json.dumps({"type": "delta", "support_advice": advice[len(sent):]}) + "\n"
+                            sent = advice
+            record_agent_run(result)
+            
+            if output is None:
+                raise RuntimeError("No response from support agent")
+            # The final response joins the run's messages once the stream is exhausted
+            response = await finish_support_query(request, prepared, output, result.all_messages())
+            yield json.dumps({"type": "result", **response.model_dump()}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": f"Error processing query: {str(e)}"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def batch_results_stream(job, cursor: int = 0) -> StreamingResponse:
+    """Stream a batch job's results as NDJSON as they complete, then a final `summary` line."""
+    
+    async def lines():
+        async for result in job.stream(cursor):
+            yield json.dumps({"type": "result", **result}) + "\n"
+        yield json.dumps({"type": "summary", **job.summary()}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@agent_router.post(
+    "/query/batch",
+    summary="Submit Batch of Support Queries",
+    description=(
+        "Answer many support queries as a background job with bounded parallelism, e.g. to triage historical tickets. "
+        "Returns the job ID, or streams results as NDJSON as they complete with `stream=true`"
+    ),
+    status_code=202,
+    responses={
+        202: {"description": "Job accepted; poll `GET /agent/query/batch/{job_id}` for results"},
+        400: {"description": "Empty or oversized batch"}
+    }
+)
+async def submit_batch_query(request: BatchQueryRequest, stream: bool = False):
+    """
+Submit a batch of support queries. Results keep the `index` of their query in the request.
+    """
+    if not request.queries or len(request.queries) > settings.batch_max_queries:
+        raise HTTPException(status_code=400, detail=f"A batch must contain between 1 and {settings.batch_max_queries} queries")
+    try:
+        job = batch_jobs.submit(request.queries)
+        if stream:
+            return batch_results_stream(job)
+        return job.summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting batch: {str(e)}")
+
+
+@agent_router.get(
+    "/query/batch/{job_id}",
+    response_model=dict,
+    summary="Get Batch Results",
+    description=(
+        "Get a batch job's progress and the results completed after `cursor`, in completion order. "
+        "Pass the returned `next_cursor` to fetch only new results; `format=ndjson` streams them until the job finishes"
+    ),
+    responses={404: {"description": "Batch job not found or expired"}}
+)
+async def get_batch_query(job_id: str, cursor: int = Query(default=0, ge=0), limit: int = Query(default=1000, ge=1, le=10000), format: str = "json"):
+    """
+Fetch batch job results incrementally.
+    """
+    job = batch_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Batch job {job_id} not found")
+    if format == "ndjson":
+        return batch_results_stream(job, cursor)
+    results = job.results[cursor:cursor + limit]
+    return {**job.summary(), "results": results, "next_cursor": cursor + len(results)}
+
+
+@agent_router.delete(
+    "/query/batch/{job_id}",
+    response_model=dict,
+    summary="Cancel Batch Job",
+    description="Stop a running batch job; results completed so far remain available",
+    responses={404: {"description": "Batch job not found or expired"}}
+)
+async def cancel_batch_query(job_id: str):
+    """
+Cancel a batch job.
+    """
+    job = batch_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Batch job {job_id} not found")
+    await batch_jobs.cancel(job)
+    return job.summary()
+
+
+def faq_page(faqs: list[dict], limit: int) -> dict:
+    """Wrap a page of FAQs with the cursor for the next page, if there may be one."""
+    
+    return {"faqs": faqs, "next_cursor": faqs[-1]["id"] if len(faqs) == limit else None}
+
+
+def faq_export(category: str = None) -> StreamingResponse:
+    """Stream FAQs as NDJSON, one object per line."""
+    
+    async def lines():
+        async for faq in DataconnectionFaq.stream_faqs(category=category):
+            yield json.dumps(faq) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @faq_router.get(
     "/", 
     response_model=dict,
     summary="Get All FAQs",
-    description="Retrieve all FAQ entries from the database with questions, answers, and categories",
+    description="Retrieve FAQ entries ordered by ID with keyset pagination (`cursor` + `limit`), or export them all as NDJSON with `format=ndjson`",
     responses={
-        200: {"description": "List of all FAQs retrieved successfully"},
+        200: {"description": "Page of FAQs retrieved successfully, with `next_cursor` for the following page"},
         404: {"description": "No FAQs found in database"}
     }
 )
-async def get_faqs():
+async def get_faqs(cursor: int = None, limit: int = Query(default=100, ge=1, le=1000), format: str = "json"):
     """
-Retrieve all FAQ entries from the database.
+Retrieve FAQ entries from the database.
     """
+    if format == "ndjson":
+        return faq_export()
     try:
-        faqs = await DataconnectionFaq.get_faqs()
+        faqs = await DataconnectionFaq.get_faqs(cursor=cursor, limit=limit)
         
-        if not faqs:
+        if not faqs and cursor is None:
             raise HTTPException(status_code=404, detail="No FAQs found")
         
-        return {"faqs": faqs}
+        return faq_page(faqs, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving FAQs: {str(e)}")
 
@@ -89,23 +267,25 @@ Retrieve all FAQ entries from the database.
     "/{category}", 
     response_model=dict,
     summary="Get FAQs by Category",
-    description="Retrieve FAQ entries filtered by specific category",
+    description="Retrieve FAQ entries filtered by specific category, with the same pagination and export options as the full listing",
     responses={
         200: {"description": "FAQs for category retrieved successfully"},
         404: {"description": "No FAQs found for the specified category"}
     }
 )
-async def get_faq_by_category(category: str):
+async def get_faq_by_category(category: str, cursor: int = None, limit: int = Query(default=100, ge=1, le=1000), format: str = "json"):
     """
 Retrieve FAQ entries filtered by category.
     """
+    if format == "ndjson":
+        return faq_export(category)
     try:
-        faqs = await DataconnectionFaq.get_faq_by_category(category)
+        faqs = await DataconnectionFaq.get_faq_by_category(category, cursor=cursor, limit=limit)
         
-        if not faqs:
+        if not faqs and cursor is None:
             raise HTTPException(status_code=404, detail=f"No FAQs found for category '{category}'")
         
-        return {"faqs": faqs}
+        return faq_page(faqs, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving FAQs for category '{category}': {str(e)}")
 
@@ -117,6 +297,7 @@ Retrieve FAQ entries filtered by category.
     description="Add a new FAQ entry with automatic vector embedding generation",
     responses={
         200: {"description": "FAQ created successfully"},
+        409: {"description": "An FAQ with the same question and answer already exists"},
         500: {"description": "Error creating FAQ entry"}
     }
 )
@@ -125,17 +306,64 @@ async def create_faq(faq: FaqCreateRequest):
 Create a new FAQ entry in the database.
     """
     try:
-        embedding = await generate_embedding(f"{faq.question}\n{faq.answer}")
+        # Document embeddings stay out of the query embedding cache, like imports and re-embedding
+        [embedding] = await generate_embeddings([f"{faq.question}\n{faq.answer}"], cache=False)
         await DataconnectionFaq.add_faq(faq.question, faq.answer, faq.category, embedding)
+        response_cache.invalidate()
         return FaqCreateRequest(
             question=faq.question,
             answer=faq.answer,
             category=faq.category
         )
+    except UpstreamOverloaded:
+        raise
+    except DuplicateFaq as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating FAQ: {str(e)}")
 
 
+@faq_router.post(
+    "/import",
+    summary="Bulk Import FAQs",
+    description="Import FAQs from a JSONL or CSV upload with batched embedding generation and multi-row inserts, streaming progress as NDJSON",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "`progress` events after each committed batch, then a `complete` or `error` event",
+            "content": {"application/x-ndjson": {}}
+        },
+        400: {"description": "Unsupported import format"}
+    }
+)
+async def import_faq_file(file: UploadFile, format: str = None, batch_size: int = 256):
+    """
+Bulk import FAQ entries. Re-running a failed import skips rows that are already stored.
+    """
+    format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "jsonl")
+    if format not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail=f"Unsupported import format '{format}', expected 'jsonl' or 'csv'")
+
+    # The upload is closed once this handler returns, so keep a private copy for the streaming response
+    spool = tempfile.TemporaryFile()
+    await asyncio.to_thread(shutil.copyfileobj, file.file, spool)
+    spool.seek(0)
+
+    async def events():
+        progress = {}
+        with io.TextIOWrapper(spool, encoding="utf-8", newline="") as stream:
+            try:
+                async for progress in import_faqs(iter_faq_records(stream, format), batch_size=batch_size):
+                    if progress["inserted"]:
+                        response_cache.invalidate()
+                    yield json.dumps({"type": "progress", **progress}) + "\n"
+                yield json.dumps({"type": "complete", **progress}) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "detail": f"Error importing FAQs: {str(e)}", **progress}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @faq_router.put(
     "/{faq_id}", 
     response_model=FaqCreateRequest,
@@ -144,6 +372,7 @@ Create a new FAQ entry in the database.
     responses={
         200: {"description": "FAQ updated successfully"},
         404: {"description": "FAQ with specified ID not found"},
+        409: {"description": "Another FAQ has the same question and answer"},
         500: {"description": "Error updating FAQ entry"}
     }
 )
@@ -155,7 +384,13 @@ Update an existing FAQ entry by ID.
         updated_faq = await DataconnectionFaq.update_faq(faq_id, faq.question, faq.answer, faq.category)
         if not updated_faq:
             raise HTTPException(status_code=404, detail=f"FAQ with id {faq_id} not found")
+        response_cache.invalidate()
+        reembedding_worker.notify()
         return updated_faq
+    except HTTPException:
+        raise
+    except DuplicateFaq as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating FAQ: {str(e)}")
 
@@ -177,6 +412,7 @@ Delete an FAQ entry by ID.
     """
     try:
         result = await DataconnectionFaq.delete_faq(faq_id)
+        response_cache.invalidate()
         if "message" in result:
             return {"message": result["message"]}
         else:
@@ -184,3 +420,44 @@ Delete an FAQ entry by ID.
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting FAQ: {str(e)}")
 
+
+@admin_router.post(
+    "/faq/index/rebuild",
+    response_model=dict,
+    summary="Rebuild FAQ Vector Index",
+    description="Rebuild the approximate nearest neighbour indexes on FAQ embeddings using the current settings, concurrently with reads and writes",
+    responses={
+        200: {"description": "Vector index rebuilt successfully"},
+        500: {"description": "Error rebuilding vector index"}
+    }
+)
+async def rebuild_faq_index():
+    """
+Rebuild the FAQ embedding index.
+    """
+    try:
+        return await DataconnectionFaq.rebuild_vector_index()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding vector index: {str(e)}")
+
+
+@admin_router.post(
+    "/faq/reembed",
+    response_model=dict,
+    summary="Re-embed All FAQs",
+    description="Mark every FAQ embedding as stale so the background worker recomputes it, e.g. after changing the embedding model",
+    responses={
+        200: {"description": "Full re-embedding queued successfully"},
+        500: {"description": "Error queueing re-embedding"}
+    }
+)
+async def reembed_faqs():
+    """
+Queue a full re-embedding of the FAQ knowledge base.
+    """
+    try:
+        queued = await DataconnectionFaq.invalidate_embeddings()
+        reembedding_worker.notify()
+        return {"message": "Re-embedding queued successfully", "queued": queued}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing re-embedding: {str(e)}")
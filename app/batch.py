@@ -0,0 +1,177 @@
+import asyncio
+import time
+import uuid
+from collections.abc import AsyncIterator
+from app.agent import SupportDependencies, generate_embeddings, run_support_query, uses_query_embedding
+from app.config import settings
+from app.database import DataconnectionFaq, DataconnectionUser
+from app.limiter import UpstreamOverloaded
+from app.models import QueryRequest
+
+
+class BatchJob:
+    """A batch of support queries answered in the background, with results kept in completion order."""
+
+    def __init__(self, requests: list[QueryRequest]):
+        self.id = uuid.uuid4().hex
+        self.requests = requests
+        self.results: list[dict] = []
+        self.status = "pending"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._updated = asyncio.Condition()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    async def _publish(self, result: dict = None):
+        async with self._updated:
+            if result is not None:
+                self.results.append(result)
+            self._updated.notify_all()
+
+    async def _answer(self, index: int, request: QueryRequest, profile: dict | None, embedding: list[float] | None) -> dict:
+        deps = SupportDependencies(user_id=request.user_id, db=DataconnectionUser(), faqdb=DataconnectionFaq())
+        deps.use_user_profile(profile)
+        for attempt in range(settings.batch_overload_retries + 1):
+            try:
+                response, _ = await run_support_query(request, deps, query_embedding=embedding)
+                return {"index": index, **response.model_dump()}
+            except UpstreamOverloaded as e:
+                # Batch work is not latency sensitive: back off instead of failing the item
+                if attempt == settings.batch_overload_retries:
+                    return {"index": index, "user_id": request.user_id, "query": request.query, "error": str(e)}
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                return {"index": index, "user_id": request.user_id, "query": request.query, "error": str(e)}
+
+    async def run(self, concurrency: int):
+        """Answer every query with at most `concurrency` agent runs in flight."""
+
+        self.status = "running"
+        try:
+            # One profile query for all users, shared by every item
+            profiles = await DataconnectionUser.user_profiles({request.user_id for request in self.requests})
+            embeddings = await self._embed_queries()
+
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def run_one(index: int, request: QueryRequest, embedding: list[float] | None):
+                async with semaphore:
+                    result = await self._answer(index, request, profiles.get(request.user_id), embedding)
+                await self._publish(result)
+
+            await asyncio.gather(*(run_one(i, r, e) for i, (r, e) in enumerate(zip(self.requests, embeddings))))
+            self.status = "completed"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            await self._publish()
+
+    async def _embed_queries(self) -> list[list[float] | None]:
+        """
+        Embed, in one call, the queries that run_support_query would embed anyway. Items left as None embed lazily
+        if needed, so a failed call degrades to per-item embeddings instead of failing the job.
+        """
+
+        embeddings = [None] * len(self.requests)
+        indexes = [i for i, request in enumerate(self.requests) if uses_query_embedding(request)]
+        if not indexes:
+            return embeddings
+        try:
+            vectors = await generate_embeddings([self.requests[i].query for i in indexes])
+        except Exception as e:
+            print(f"Warning: Batch query embeddings failed, embedding per item instead: {e}")
+            return embeddings
+        for i, vector in zip(indexes, vectors):
+            embeddings[i] = vector
+        return embeddings
+
+    async def stream(self, cursor: int = 0) -> AsyncIterator[dict]:
+        """Yield results from position `cursor` on as they complete, until the job is done."""
+
+        while True:
+            async with self._updated:
+                await self._updated.wait_for(lambda: len(self.results) > cursor or self.done)
+                new_results = self.results[cursor:]
+            for result in new_results:
+                yield result
+            cursor += len(new_results)
+            if self.done and cursor >= len(self.results):
+                return
+
+    def summary(self) -> dict:
+        """Job progress without the results."""
+
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.requests),
+            "completed": len(self.results),
+            "failed": sum(1 for result in self.results if "error" in result),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BatchJobManager:
+    """In-process registry of batch jobs. Finished jobs are dropped after `ttl_seconds`."""
+
+    def __init__(self, concurrency: int, ttl_seconds: float):
+        self.concurrency = concurrency
+        self.ttl_seconds = ttl_seconds
+        self._jobs: dict[str, BatchJob] = {}
+
+    def _purge(self):
+        expired = time.time() - self.ttl_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < expired]:
+            del self._jobs[job_id]
+
+    def submit(self, requests: list[QueryRequest]) -> BatchJob:
+        """Register a job and start answering its queries in the background."""
+
+        self._purge()
+        job = BatchJob(requests)
+        self._jobs[job.id] = job
+        job._task = asyncio.create_task(job.run(self.concurrency))
+        return job
+
+    def get(self, job_id: str) -> BatchJob | None:
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job: BatchJob):
+        """Stop a running job; results completed so far are kept."""
+
+        if job._task and not job._task.done():
+            job._task.cancel()
+            try:
+                await job._task
+            except asyncio.CancelledError:
+                pass
+
+    async def shutdown(self):
+        """Cancel every running job, e.g. on application shutdown."""
+
+        for job in list(self._jobs.values()):
+            await self.cancel(job)
+
+    def stats(self) -> dict:
+        """Job counts by status, for the health endpoint."""
+
+        self._purge()
+        statuses = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"jobs": statuses, "concurrency": self.concurrency}
+
+
+batch_jobs = BatchJobManager(settings.batch_query_concurrency, settings.batch_job_ttl_seconds)
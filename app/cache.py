@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+import numpy as np
+from app.config import settings, get_data_dir
+
+
+class SQLiteEmbeddingStore:
+    """
+    SQLite-backed embedding store that several worker processes can share through one file.
+    SQLite errors (a locked or full database, a broken file) are logged: reads count as misses and writes are skipped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> list[float] | None:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Embedding cache read failed: {e}")
+            return None
+        if not row:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def _set(self, key: str, value: list[float], ttl_seconds: float):
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                    (key, array("f", value).tobytes(), time.time() + ttl_seconds),
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._conn.execute("DELETE FROM embeddings WHERE expires_at <= ?", (time.time(),))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                print(f"Warning: Embedding cache write failed: {e}")
+
+    async def get(self, key: str) -> list[float] | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: list[float], ttl_seconds: float):
+        await asyncio.to_thread(self._set, key, value, ttl_seconds)
+
+
+class EmbeddingCache:
+    """Bounded LRU cache with TTL eviction for query embeddings, optionally backed by a shared store."""
+
+    def __init__(self, max_size: int, ttl_seconds: float, backend: SQLiteEmbeddingStore = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        """Build a cache key from whitespace- and case-normalized text plus the embedding model name."""
+
+        normalized = " ".join(text.split()).casefold()
+        return hashlib.sha256(f"{model}\x00{normalized}".encode()).hexdigest()
+
+    async def get(self, key: str) -> list[float] | None:
+        """Return the cached embedding for a key, or None on a miss."""
+
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry:
+            del self._entries[key]
+
+        if self.backend:
+            value = await self.backend.get(key)
+            if value is not None:
+                self._store(key, value)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: list[float]):
+        """Store an embedding in the local cache and the shared backend, if any."""
+
+        self._store(key, value)
+        if self.backend:
+            await self.backend.set(key, value, self.ttl_seconds)
+
+    def _store(self, key: str, value: list[float]):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for health and metrics endpoints."""
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+            "backend": "sqlite" if self.backend else "memory",
+        }
+
+
+class SemanticResponseCache:
+    """
+    Cache of agent results looked up by query-embedding similarity within the same user context.
+    Entries belong to one knowledge base version; a lookup with a newer version drops them all.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, threshold: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._entries: list[tuple[float, tuple, np.ndarray, dict]] = []
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: list[float], context: tuple, version: int = None) -> dict | None:
+        """Return the cached result whose query is most similar to this one, if above the threshold."""
+
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+        now = time.monotonic()
+        self._entries = [entry for entry in self._entries if entry[0] > now]
+        candidates = [entry for entry in self._entries if entry[1] == context]
+        if candidates:
+            similarities = np.stack([entry[2] for entry in candidates]) @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                self.hits += 1
+                return candidates[best][3]
+
+        self.misses += 1
+        return None
+
+    def store(self, embedding: list[float], context: tuple, result: dict, version: int = None):
+        """Cache an agent result for a query embedding and user context, unless the knowledge base changed since."""
+
+        if version != self.version:
+            return
+        self._entries.append((time.monotonic() + self.ttl_seconds, context, self._normalize(embedding), result))
+        if len(self._entries) > self.max_size:
+            self._entries.pop(0)
+
+    def invalidate(self):
+        """Drop every cached result, e.g. after the FAQ knowledge base changes."""
+
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for health and metrics endpoints."""
+
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.response_cache_enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+
+def create_embedding_cache() -> EmbeddingCache:
+    """Build the embedding cache described by the application settings."""
+
+    backend = None
+    if settings.embedding_cache_backend == "sqlite":
+        backend = SQLiteEmbeddingStore(settings.embedding_cache_path or str(get_data_dir() / "embedding_cache.sqlite3"))
+    return EmbeddingCache(settings.embedding_cache_size, settings.embedding_cache_ttl_seconds, backend)
+
+
+embedding_cache = create_embedding_cache()
+response_cache = SemanticResponseCache(
+    settings.response_cache_size, settings.response_cache_ttl_seconds, settings.response_cache_similarity_threshold
+)
@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
 from pathlib import Path
@@ -15,6 +16,10 @@ def get_project_root() -> Path:
     return current_path.parent
 
 
+# Fixed output size of embedding models that don't accept a `dimensions` parameter
+NATIVE_EMBEDDING_DIMENSIONS = {"text-embedding-ada-002": 1536}
+
+
 def get_data_dir() -> Path:
     """Get the data directory and ensure it exists"""
     
@@ -29,6 +34,12 @@ class Settings(BaseSettings):
     openai_api_key: str = 'your-default-api-key'
     openai_model: str = 'gpt-3.5-turbo'
     openai_embedding_model_name: str = 'text-embedding-3-small'
+    openai_base_url: str = ''  # e.g. an OpenAI-compatible stand-in for load tests; empty uses the OpenAI API
+    
+    # Embedding size and storage. text-embedding-3 models can return fewer dimensions; 'halfvec' stores 16-bit floats
+    # (pgvector 0.7+). Changing either converts faqs.embedding at startup
+    embedding_dimensions: int = 1536
+    embedding_storage: str = 'vector'  # 'vector' or 'halfvec'
     
     # PostgreSQL configuration
     postgres_host: str = 'localhost'
@@ -37,12 +48,125 @@ class Settings(BaseSettings):
     postgres_password: str = 'password'
     postgres_db: str = 'supportagent'
     
+    # Connection pool configuration, per worker process: keep workers * (pool size + overflow) below max_connections
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30  # seconds to wait for a free connection before failing
+    db_pool_recycle: int = 1800  # replace connections older than this many seconds (-1 disables)
+    db_pool_pre_ping: bool = True  # check connections on checkout so restarts/failovers don't surface as errors
+    
+    # Startup schema bootstrap: when the database is unreachable, retry in the background with jittered exponential backoff
+    schema_retry_initial_seconds: float = 1
+    schema_retry_max_seconds: float = 30
+    
+    # Set when connecting through PgBouncer (or another pooler) in transaction mode: disables prepared statement caching
+    db_pgbouncer: bool = False
+    
+    # Approximate nearest neighbour index on faqs.embedding: 'hnsw', 'ivfflat' or 'none'
+    faq_vector_index: str = 'hnsw'
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+    ivfflat_lists: int = 100
+    ivfflat_probes: int = 10
+    
+    # Binary-quantized pre-filter: shortlist candidates by Hamming distance on a bit index, then re-rank at full precision
+    embedding_binary_prefilter: bool = False
+    binary_prefilter_candidates: int = 100
+    
+    # FAQ retrieval: 'hybrid' fuses full-text and vector candidates with reciprocal rank fusion, 'vector' uses embeddings only
+    faq_search_mode: str = 'hybrid'
+    hybrid_search_candidates: int = 20
+    hybrid_search_rrf_k: int = 60
+    
+    # Pre-retrieval RAG: search FAQs before the agent run and put the top entries in the system prompt,
+    # saving the faq_search tool round-trip. Requests can override it with `preretrieval`
+    faq_preretrieval: bool = False
+    faq_preretrieval_top_k: int = 3
+    
+    # Vector search backend: 'pgvector', or 'memory' to hold all embeddings in a NumPy matrix in each worker
+    faq_search_backend: str = 'pgvector'
+    memory_index_quantization: str = 'float32'  # 'float32' or 'int8'
+    
+    # Query embedding cache: 'memory' or 'sqlite' (shared between workers through one file)
+    embedding_cache_backend: str = 'memory'
+    embedding_cache_path: str = ''
+    embedding_cache_size: int = 10000
+    embedding_cache_ttl_seconds: int = 86400
+    
+    # Embedding request batching: concurrent calls within the window share one API request (0 disables)
+    embedding_batch_window_ms: float = 5
+    embedding_batch_size: int = 256
+    
+    # Semantic response cache for near-duplicate questions from the same user. Safe with several workers and the
+    # import CLI: every FAQ change bumps a version in the database, and each lookup drops entries of older versions
+    response_cache_enabled: bool = False
+    response_cache_similarity_threshold: float = 0.95
+    response_cache_size: int = 1000
+    response_cache_ttl_seconds: int = 3600
+    
+    # Background re-embedding of FAQs whose question/answer changed
+    reembed_enabled: bool = True
+    reembed_batch_size: int = 100
+    reembed_interval_seconds: float = 60
+    
+    # Upstream OpenAI backpressure: concurrency slots, bounded wait queue and optional token budgets (0 = unlimited)
+    openai_chat_max_concurrency: int = 16
+    openai_embedding_max_concurrency: int = 8
+    openai_max_queue: int = 256
+    openai_queue_timeout_seconds: float = 10
+    openai_chat_tokens_per_minute: int = 0
+    openai_embedding_tokens_per_minute: int = 0
+    openai_max_retries: int = 3
+    
+    # Batch query jobs: agent runs in flight per job, largest accepted batch and how long finished jobs are kept
+    batch_query_concurrency: int = 8
+    batch_max_queries: int = 10000
+    batch_job_ttl_seconds: int = 3600
+    batch_overload_retries: int = 5
+    
+    # LLM-free fast path for deterministic account questions: 'off', 'rules', or 'embedding' (rules, then example similarity)
+    fast_path_mode: str = 'off'
+    fast_path_similarity_threshold: float = 0.88
+    
+    # Conversation sessions: history token budget, newest turns kept verbatim (older ones are compacted) and expiry
+    session_history_max_tokens: int = 2000
+    session_full_turns: int = 1
+    session_ttl_seconds: int = 86400
+    
+    # Add a per-request Server-Timing header with the stage latency breakdown
+    server_timing_enabled: bool = False
+    
+    @model_validator(mode="after")
+    def check_embedding_dimensions(self):
+        """Reject an EMBEDDING_DIMENSIONS that the embedding model cannot produce, before any column is converted."""
+        
+        native = NATIVE_EMBEDDING_DIMENSIONS.get(self.openai_embedding_model_name)
+        if not self.embedding_dimensions_supported and native and self.embedding_dimensions != native:
+            raise ValueError(
+                f"{self.openai_embedding_model_name} always returns {native}-dimensional embeddings and has no "
+                f"`dimensions` parameter; set EMBEDDING_DIMENSIONS={native}"
+            )
+        return self
+    
+    @property
+    def embedding_dimensions_supported(self) -> bool:
+        """Whether the embedding model accepts a `dimensions` parameter (text-embedding-3 models do)."""
+        
+        return self.openai_embedding_model_name.startswith("text-embedding-3")
+    
     @property
     def database_url(self) -> str:
         """Construct the database URL for PostgreSQL with pgvector support."""
         
         return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
     
+    @property
+    def async_database_url(self) -> str:
+        """Construct the asyncpg database URL used by the async engine."""
+        
+        return f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -1,14 +1,171 @@
-from sqlalchemy import create_engine, text
+import hashlib
+import re
+import uuid
+from datetime import timedelta
+from time import perf_counter
+from sqlalchemy import bindparam, create_engine, event, func, text, select, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import deferred, sessionmaker
 from app.config import settings
-from contextlib import contextmanager
-from sqlalchemy import Column, Integer, String
-from pgvector.sqlalchemy import Vector
+from app.metrics import STAGE_SECONDS, track_stage
+from contextlib import asynccontextmanager
+from sqlalchemy import Column, Computed, DateTime, Integer, LargeBinary, String
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from pgvector import HalfVector, Vector as PgVector
+from pgvector.sqlalchemy import HALFVEC, Vector
+import numpy as np
+
+
+# Checkout wait statistics of the async engine's pool, reported through /health
+pool_wait_stats = {"checkouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "timeouts": 0}
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long each checkout waits for a free connection."""
+    
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_wait_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = perf_counter() - started
+            pool_wait_stats["checkouts"] += 1
+            pool_wait_stats["wait_seconds_total"] += waited
+            pool_wait_stats["wait_seconds_max"] = max(pool_wait_stats["wait_seconds_max"], waited)
+            STAGE_SECONDS.labels("db_pool_wait").observe(waited)
+
+
+def async_connect_args() -> dict:
+    """asyncpg connection arguments; a transaction-mode pooler can't keep prepared statements between transactions."""
+    
+    if not settings.db_pgbouncer:
+        return {}
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        # Unique names, so statements prepared on one server connection never clash on another
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+
+
+pool_options = {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+    "pool_recycle": settings.db_pool_recycle,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+}
+
+# Engines are created on first use, so importing this module never loads the database drivers
+_engine = None
+_async_engine = None
+_async_session_factory = None
+
+
+def get_engine():
+    """Synchronous engine, kept for offline scripts such as scripts/seed.py."""
+    
+    global _engine
+    if _engine is None:
+        _engine = create_engine(settings.database_url, **pool_options)
+    return _engine
+
+
+def sync_session():
+    """Open a synchronous session on the sync engine."""
+    
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())()
+
+
+def get_async_engine():
+    """Async engine used by the API so database I/O never blocks the event loop."""
+    
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            settings.async_database_url,
+            poolclass=InstrumentedAsyncQueuePool,
+            connect_args=async_connect_args(),
+            **pool_options,
+        )
+        event.listen(_async_engine.sync_engine, "connect", register_vector_codec)
+        _async_session_factory = async_sessionmaker(bind=_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def dispose_engines():
+    """Close the pooled connections of every engine created so far."""
+    
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+
+
+def pool_status() -> dict:
+    """Utilization and checkout wait times of the async engine's connection pool."""
+    
+    pool = get_async_engine().pool
+    checked_out = pool.checkedout()
+    capacity = settings.db_pool_size + settings.db_max_overflow
+    checkouts = pool_wait_stats["checkouts"]
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "utilization": checked_out / capacity if capacity else 0.0,
+        "checkouts": checkouts,
+        "avg_wait_ms": pool_wait_stats["wait_seconds_total"] * 1000 / checkouts if checkouts else 0.0,
+        "max_wait_ms": pool_wait_stats["wait_seconds_max"] * 1000,
+        "timeouts": pool_wait_stats["timeouts"],
+        "pgbouncer": settings.db_pgbouncer,
+    }
+
+
+def _encode_vector(value):
+    """Encode a vector parameter in pgvector's binary format, accepting the ORM's text form too."""
+    
+    if isinstance(value, str):
+        value = PgVector.from_text(value)
+    return PgVector._to_db_binary(value)
+
+
+def _encode_halfvec(value):
+    """Encode a halfvec parameter in pgvector's binary format, accepting the ORM's text form too."""
+    
+    if isinstance(value, str):
+        value = HalfVector.from_text(value)
+    return HalfVector._to_db_binary(value)
+
+
+async def _register_vector_codec(conn):
+    # The extension may not be installed yet on a fresh database, and halfvec needs pgvector 0.7+
+    for type_name, encoder, decoder in (
+        ("vector", _encode_vector, PgVector._from_db_binary),
+        ("halfvec", _encode_halfvec, HalfVector._from_db_binary),
+    ):
+        try:
+            await conn.set_type_codec(type_name, schema="public", encoder=encoder, decoder=decoder, format="binary")
+        except ValueError as e:
+            if not str(e).startswith("unknown type:"):
+                raise
+
+
+def register_vector_codec(dbapi_connection, connection_record):
+    """Send and receive pgvector values as binary on every pooled asyncpg connection."""
+    
+    dbapi_connection.run_async(_register_vector_codec)
 
 
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 class User(Base):
@@ -23,6 +180,40 @@ class User(Base):
     subscription_plan = Column(String, nullable=False)  # e.g., 'free', 'basic', 'premium', "enterprise"
 
 
+# Full-text document for lexical FAQ search: question terms weigh more than answer terms
+FAQ_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(question, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(answer, '')), 'B')"
+)
+
+# SQL counterpart of faq_content_hash(), declared immutable so faqs.content_hash can be a generated column.
+# It must exist before the faqs table is created
+FAQ_CONTENT_HASH_FUNCTION_DDL = """
+    CREATE OR REPLACE FUNCTION faq_content_hash(question text, answer text) RETURNS varchar
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$ SELECT encode(sha256(convert_to(question || E'\\n' || answer, 'UTF8')), 'hex') $$
+"""
+
+
+class HalfVec(HALFVEC):
+    """halfvec column read back as float32 NumPy arrays, like Vector columns."""
+    
+    cache_ok = True
+    
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            return None if value is None else HalfVector._from_db(value).to_numpy().astype(np.float32)
+        return process
+
+
+def embedding_column_type():
+    """Column type of faqs.embedding for the configured storage and dimensions."""
+    
+    if settings.embedding_storage == "halfvec":
+        return HalfVec(settings.embedding_dimensions)
+    return Vector(settings.embedding_dimensions)
+
+
 class Faq(Base):
     """FAQ model for managing frequently asked questions and their answers."""
     
@@ -32,103 +223,538 @@ class Faq(Base):
     question = Column(String, nullable=False)
     answer = Column(String, nullable=False)
     category = Column(String, nullable=True)  # e.g., 'billing', 'technical', 'general'
-    embedding = Column(Vector(1536), nullable=True)  # OpenAI embeddings are 1536 dimensions
+    embedding = Column(embedding_column_type(), nullable=True)  # EMBEDDING_STORAGE(EMBEDDING_DIMENSIONS)
+    content_hash = Column(String(64), Computed("faq_content_hash(question, answer)", persisted=True), unique=True, index=True)  # Hash of the current question/answer
+    embedding_hash = Column(String(64), nullable=True)  # content_hash of the question/answer the embedding was built from
+    search_vector = deferred(Column(TSVECTOR, Computed(FAQ_SEARCH_VECTOR, persisted=True)))  # Full-text search document
     
     def __repr__(self):
         return f"<FAQ(question={self.question}, answer={self.answer}, category={self.category})>"
 
 
-def ensure_tables_exist():
+class ConversationSession(Base):
+    """Conversation session model storing the trimmed, compressed agent message history."""
+    
+    __tablename__ = "conversation_sessions"
+    
+    session_id = Column(String(128), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    messages = Column(LargeBinary, nullable=False)  # zlib-compressed pydantic-ai message JSON
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+
+FAQ_EMBEDDING_INDEX = "ix_faqs_embedding_ann"
+FAQ_EMBEDDING_BINARY_INDEX = "ix_faqs_embedding_binary"
+VECTOR_INDEX_BUILD_LOCK = "faqs vector index build"  # Advisory lock shared by the startup build and admin rebuilds
+EMBEDDING_TYPE_PATTERN = re.compile(r"^(vector|halfvec)\((\d+)\)$")
+
+# Idempotent migrations for tables created before a column or index was added to the models
+SCHEMA_MIGRATIONS = [
+    # content_hash used to record what the embedding was built from: that moves to embedding_hash, and
+    # content_hash becomes a generated hash of the current text with a unique index for import dedupe
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_attribute WHERE attrelid = 'faqs'::regclass AND attname = 'content_hash' AND attgenerated = 's'
+        ) THEN
+            ALTER TABLE faqs ADD COLUMN IF NOT EXISTS embedding_hash VARCHAR(64);
+            IF EXISTS (SELECT 1 FROM pg_attribute WHERE attrelid = 'faqs'::regclass AND attname = 'content_hash') THEN
+                UPDATE faqs SET embedding_hash = content_hash;
+                ALTER TABLE faqs DROP COLUMN content_hash;
+            END IF;
+            ALTER TABLE faqs ADD COLUMN content_hash VARCHAR(64) GENERATED ALWAYS AS (faq_content_hash(question, answer)) STORED;
+        END IF;
+        BEGIN
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_faqs_content_hash ON faqs (content_hash);
+        EXCEPTION WHEN unique_violation THEN
+            RAISE WARNING 'faqs contains duplicate question/answer pairs, remove them to enable the unique content_hash index';
+        END;
+    END $$
+    """,
+    f"ALTER TABLE faqs ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({FAQ_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_faqs_search_vector ON faqs USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_faqs_category ON faqs (category)",
+]
+
+# Change notifications for the in-memory vector index: every write to faqs sends the row id on this channel
+FAQ_CHANGES_CHANNEL = "faq_changes"
+FAQ_CHANGE_NOTIFY_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION notify_faq_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{FAQ_CHANGES_CHANNEL}', COALESCE(NEW.id, OLD.id)::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS faqs_notify_change ON faqs",
+    "CREATE TRIGGER faqs_notify_change AFTER INSERT OR UPDATE OR DELETE ON faqs "
+    "FOR EACH ROW EXECUTE FUNCTION notify_faq_change()",
+]
+
+# Knowledge base version, bumped by a trigger on every FAQ content change from any process (API workers, the
+# import CLI, manual SQL). The semantic response cache drops its entries when the version moves
+FAQ_VERSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS faq_version (id integer PRIMARY KEY CHECK (id = 1), version bigint NOT NULL)",
+    "INSERT INTO faq_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+    """
+    CREATE OR REPLACE FUNCTION bump_faq_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE faq_version SET version = version + 1 WHERE id = 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS faqs_bump_version ON faqs",
+    "CREATE TRIGGER faqs_bump_version AFTER INSERT OR DELETE OR UPDATE OF question, answer, category ON faqs "
+    "FOR EACH STATEMENT EXECUTE FUNCTION bump_faq_version()",
+]
+
+# Outcome of the startup schema bootstrap, reported through /health. vector_index and binary_prefilter hold
+# "failed: <error>" when their index could not be built
+schema_status = {
+    "ready": False, "pgvector": False, "pgvector_version": None, "embedding": None, "vector_index": None,
+    "binary_prefilter": False, "error": None,
+}
+
+# Category filters are applied to the rows an ANN index scan returns, so a filtered search can come back short.
+# pgvector 0.8+ scans iteratively until enough rows match; older versions get a larger candidate list instead
+FILTERED_SEARCH_FACTOR = 4
+HNSW_MAX_EF_SEARCH = 1000
+
+
+def _create_index(name: str, concurrently: bool) -> str:
+    return f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} ON faqs"
+
+
+def vector_index_ddl(name: str = FAQ_EMBEDDING_INDEX, concurrently: bool = False) -> str | None:
+    """Build the CREATE INDEX statement for the configured ANN index type on faqs.embedding."""
+    
+    if settings.faq_vector_index == "hnsw":
+        return (
+            f"{_create_index(name, concurrently)} USING hnsw (embedding {settings.embedding_storage}_l2_ops) "
+            f"WITH (m = {int(settings.hnsw_m)}, ef_construction = {int(settings.hnsw_ef_construction)})"
+        )
+    if settings.faq_vector_index == "ivfflat":
+        return (
+            f"{_create_index(name, concurrently)} USING ivfflat (embedding {settings.embedding_storage}_l2_ops) "
+            f"WITH (lists = {int(settings.ivfflat_lists)})"
+        )
+    return None
+
+
+def binary_index_ddl(name: str = FAQ_EMBEDDING_BINARY_INDEX, concurrently: bool = False) -> str | None:
+    """Build the CREATE INDEX statement for the HNSW bit index used by the binary-quantized pre-filter."""
+    
+    if not settings.embedding_binary_prefilter:
+        return None
+    return (
+        f"{_create_index(name, concurrently)} "
+        f"USING hnsw ((binary_quantize(embedding)::bit({int(settings.embedding_dimensions)})) bit_hamming_ops) "
+        f"WITH (m = {int(settings.hnsw_m)}, ef_construction = {int(settings.hnsw_ef_construction)})"
+    )
+
+
+async def migrate_embedding_column(conn):
+    """
+    Convert faqs.embedding to the configured storage type and dimensions. Storage-only changes are cast in place,
+    and text-embedding-3 embeddings are shortened by truncating and re-normalizing them, which matches requesting
+    fewer dimensions. Any other change clears the embeddings and marks them stale for the re-embedding worker.
+    """
+    
+    target = f"{settings.embedding_storage}({int(settings.embedding_dimensions)})"
+    schema_status["embedding"] = target
+    column_type = text(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = 'faqs'::regclass AND attname = 'embedding' AND NOT attisdropped"
+    )
+    if await conn.scalar(column_type) == target:
+        return
+    # Workers start at the same time: the first one converts the column, the others find nothing left to do
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('faqs.embedding migration'))"))
+    current = await conn.scalar(column_type)
+    if current == target:
+        return
+    
+    match = EMBEDDING_TYPE_PATTERN.match(current or "")
+    dimensions = int(match.group(2)) if match else None
+    if dimensions == settings.embedding_dimensions:
+        using = f"embedding::{target}"
+    elif dimensions and settings.embedding_dimensions < dimensions and settings.embedding_dimensions_supported:
+        using = f"l2_normalize(subvector(embedding::vector, 1, {int(settings.embedding_dimensions)}))::{target}"
+    else:
+        using = "NULL"
+    
+    # Both ANN indexes depend on the column type; they are recreated with the matching operator class afterwards
+    for index in (FAQ_EMBEDDING_INDEX, FAQ_EMBEDDING_BINARY_INDEX):
+        await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    await conn.execute(text(f"ALTER TABLE faqs ALTER COLUMN embedding TYPE {target} USING {using}"))
+    if using == "NULL":
+        await conn.execute(text("UPDATE faqs SET embedding_hash = NULL"))
+        print(f"Converted faqs.embedding from {current} to {target}; embeddings were cleared and will be regenerated.")
+    else:
+        print(f"Converted faqs.embedding from {current} to {target}.")
+
+
+def pgvector_supports_iterative_scan() -> bool:
+    """Whether the installed pgvector (0.8+) has hnsw.iterative_scan and ivfflat.iterative_scan."""
+    
+    version = [int(part) for part in re.findall(r"\d+", schema_status["pgvector_version"] or "")[:2]]
+    return version >= [0, 8]
+
+
+async def apply_search_settings(session, ef_search: int = None, probes: int = None, filtered: bool = False):
+    """Set the ANN search knobs for the current transaction only. `filtered` searches restrict the category."""
+    
+    iterative = filtered and pgvector_supports_iterative_scan()
+    if settings.embedding_binary_prefilter or settings.faq_vector_index == "hnsw":
+        value = ef_search or settings.hnsw_ef_search
+        if settings.embedding_binary_prefilter:
+            # The pre-filter scans the HNSW bit index, which returns at most ef_search candidates
+            value = max(value, settings.binary_prefilter_candidates)
+        if filtered and not iterative:
+            value = min(value * FILTERED_SEARCH_FACTOR, HNSW_MAX_EF_SEARCH)
+        await session.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(value)})
+        if iterative:
+            await session.execute(text("SELECT set_config('hnsw.iterative_scan', 'strict_order', true)"))
+    elif settings.faq_vector_index == "ivfflat":
+        value = probes or settings.ivfflat_probes
+        if filtered and not iterative:
+            value = min(value * FILTERED_SEARCH_FACTOR, settings.ivfflat_lists)
+        await session.execute(text("SELECT set_config('ivfflat.probes', :value, true)"), {"value": str(value)})
+        if iterative:
+            # IVFFlat only supports relaxed ordering; callers re-sort by distance
+            await session.execute(text("SELECT set_config('ivfflat.iterative_scan', 'relaxed_order', true)"))
+
+
+async def ensure_tables_exist() -> bool:
     """
     Ensure all database tables exist. Create them if they don't.
-    This function is called automatically when getting a database session.
+    This function runs from the application lifespan, and again until it succeeds; request handlers never call it.
     """
     
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'vector'"))
-            if not result.fetchone():
+        async with get_async_engine().begin() as conn:
+            # Workers start at the same time: they run the DDL one after the other instead of racing on types and locks
+            await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema bootstrap'))"))
+            version = await conn.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+            schema_status.update(pgvector=version is not None, pgvector_version=version)
+            if not schema_status["pgvector"]:
                 print("Warning: pgvector extension not found. Vector operations may not work.")
 
-        Base.metadata.create_all(bind=engine)
+            await conn.execute(text(FAQ_CONTENT_HASH_FUNCTION_DDL))
+            await conn.run_sync(Base.metadata.create_all)
+            for migration in SCHEMA_MIGRATIONS + FAQ_VERSION_DDL:
+                await conn.execute(text(migration))
+            
+            if schema_status["pgvector"]:
+                await migrate_embedding_column(conn)
+            
+            if settings.faq_search_backend == "memory":
+                for statement in FAQ_CHANGE_NOTIFY_DDL:
+                    await conn.execute(text(statement))
+        schema_status.update(ready=True, error=None)
         print("Database tables ensured successfully.")
     except Exception as e:
+        schema_status.update(ready=False, error=str(e))
         print(f"Warning: Could not create tables: {e}")
+    
+    if schema_status["ready"] and schema_status["pgvector"]:
+        await ensure_vector_indexes()
+    return schema_status["ready"]
 
 
-@contextmanager
-def get_session():
-    """Context manager to get a database session."""
+async def ensure_vector_indexes():
+    """
+    Create the configured ANN indexes CONCURRENTLY, so FAQ writes continue during the build. Workers starting together
+    take turns through an advisory lock, and the later ones find the indexes already built. An index that cannot be
+    built, e.g. hnsw on pgvector < 0.5 or a vector column over 2000 dimensions, does not fail the bootstrap: searches
+    fall back to exact scans, and the error is reported through /health in place of the index status.
+    """
     
-    ensure_tables_exist()
-    session = SessionLocal()
+    indexes = [
+        ("vector_index", FAQ_EMBEDDING_INDEX, vector_index_ddl(concurrently=True), settings.faq_vector_index),
+        ("binary_prefilter", FAQ_EMBEDDING_BINARY_INDEX, binary_index_ddl(concurrently=True), True),
+    ]
     try:
+        # CONCURRENTLY cannot run inside a transaction block
+        async with get_async_engine().connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("SELECT pg_advisory_lock(hashtext(:name))"), {"name": VECTOR_INDEX_BUILD_LOCK})
+            try:
+                for key, index, ddl, built in indexes:
+                    if not ddl:
+                        continue
+                    try:
+                        # An interrupted concurrent build leaves an invalid index behind, which IF NOT EXISTS would keep
+                        valid = await conn.scalar(
+                            text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(CAST(:index AS text))"),
+                            {"index": index},
+                        )
+                        if valid is False:
+                            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+                        await conn.execute(text(ddl))
+                        schema_status[key] = built
+                    except Exception as e:
+                        schema_status[key] = f"failed: {e}"
+                        print(f"Warning: Could not create the {key.replace('_', ' ')} index: {e}")
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": VECTOR_INDEX_BUILD_LOCK})
+    except Exception as e:
+        for key, _, ddl, _ in indexes:
+            if ddl:
+                schema_status[key] = f"failed: {e}"
+        print(f"Warning: Could not create the ANN indexes: {e}")
+
+
+def faq_content_hash(question: str, answer: str) -> str:
+    """Hash an FAQ's question and answer, the same way the database computes faqs.content_hash."""
+    
+    return hashlib.sha256(f"{question}\n{answer}".encode()).hexdigest()
+
+
+# A row is stale when its embedding was built from other text, or was cleared
+STALE_EMBEDDING_CONDITION = Faq.embedding_hash.is_distinct_from(Faq.content_hash)
+
+
+class DuplicateFaq(Exception):
+    """Raised when an FAQ with the same question and answer is already stored."""
+
+
+@asynccontextmanager
+async def try_advisory_lock(name: str):
+    """
+    Hold a session-level advisory lock for the duration of the block, so only one process runs it.
+    Yields False straight away, without waiting, if another process holds the lock. The lock lives on its own
+    AUTOCOMMIT connection, which stays idle outside any transaction while the block runs. Session locks need a
+    session-mode connection: behind PgBouncer in transaction mode they are not bound to one server backend.
+    """
+    
+    async with get_async_engine().connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": name})
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": name})
+
+
+@asynccontextmanager
+async def get_session():
+    """Async context manager to get a pooled database session."""
+    
+    get_async_engine()  # also creates the session factory on first use
+    async with _async_session_factory() as session:
         yield session
-    finally:
-        session.close()
 
 
 class DataconnectionUser:
     """Class for managing user account operations."""
     
     @classmethod
-    async def user_name(cls, user_id: int) -> str:
-        """Retrieve the user's name based on their user ID."""
+    async def user_profile(cls, user_id: int) -> dict | None:
+        """Retrieve the user's name, account status and subscription plan in a single query."""
         
-        with get_session() as session:
-            user = session.query(User).filter(User.user_id == user_id).first()
-            if user:
-                return user.name
+        with track_stage("user_profile"):
+            async with get_session() as session:
+                result = await session.execute(
+                    select(User.name, User.account_status, User.subscription_plan).where(User.user_id == user_id)
+                )
+                row = result.first()
+            if row:
+                return {"name": row.name, "account_status": row.account_status, "subscription_plan": row.subscription_plan}
             else:
-                return "User not found"
-
+                return None
+    
     @classmethod
-    async def account_status(cls, user_id: int) -> str:
-        """Retrieve the user's account status based on their user ID."""
+    async def user_profiles(cls, user_ids: set[int]) -> dict[int, dict]:
+        """Retrieve the profiles of many users in a single query, keyed by user ID."""
         
-        with get_session() as session:
-            user = session.query(User).filter(User.user_id == user_id).first()
-            if user:
-                return user.account_status
-            else:
-                return "User not found"
+        with track_stage("user_profile"):
+            async with get_session() as session:
+                result = await session.execute(
+                    select(User.user_id, User.name, User.account_status, User.subscription_plan)
+                    .where(User.user_id.in_(user_ids))
+                )
+                return {
+                    row.user_id: {"name": row.name, "account_status": row.account_status, "subscription_plan": row.subscription_plan}
+                    for row in result
+                }
+
 
+class DataconnectionConversation:
+    """Class for managing conversation session history."""
+    
+    _saves = 0
+    
     @classmethod
-    async def subscription_plan(cls, user_id: int) -> str:
-        """Retrieve the user's subscription plan based on their user ID."""
+    async def get_history(cls, session_id: str, user_id: int, ttl_seconds: int) -> bytes | None:
+        """Retrieve a user's stored session history, unless it expired."""
         
-        with get_session() as session:
-            user = session.query(User).filter(User.user_id == user_id).first()
-            if user:
-                return user.subscription_plan
-            else:
-                return "User not found"
+        async with get_session() as session:
+            return await session.scalar(
+                select(ConversationSession.messages).where(
+                    ConversationSession.session_id == session_id,
+                    ConversationSession.user_id == user_id,
+                    ConversationSession.updated_at > func.now() - timedelta(seconds=ttl_seconds),
+                )
+            )
+    
+    @classmethod
+    async def save_history(cls, session_id: str, user_id: int, messages: bytes, ttl_seconds: int):
+        """Store a session's history. A session ID already owned by another user is left untouched."""
+        
+        stmt = pg_insert(ConversationSession).values(session_id=session_id, user_id=user_id, messages=messages)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ConversationSession.session_id],
+            set_={"messages": stmt.excluded.messages, "updated_at": func.now()},
+            where=ConversationSession.user_id == stmt.excluded.user_id,
+        )
+        async with get_session() as session:
+            await session.execute(stmt)
+            cls._saves += 1
+            if cls._saves % 100 == 0:
+                await session.execute(
+                    delete(ConversationSession).where(ConversationSession.updated_at <= func.now() - timedelta(seconds=ttl_seconds))
+                )
+            await session.commit()
+
+
+def nearest_faqs_sql(columns: str, limit: str) -> str:
+    """
+    Select `columns` and the distance of the `limit` embedded FAQs nearest to :embedding, within :category if set.
+    With the binary pre-filter, candidates are shortlisted by Hamming distance and re-ranked at full precision.
+    """
+    
+    if not settings.embedding_binary_prefilter:
+        return f"""
+            SELECT {columns}, embedding <-> :embedding AS distance
+            FROM faqs
+            WHERE embedding IS NOT NULL
+              AND (CAST(:category AS text) IS NULL OR category = :category)
+            ORDER BY distance
+            LIMIT {limit}
+        """
+    bits = f"bit({int(settings.embedding_dimensions)})"
+    embedding_type = f"{settings.embedding_storage}({int(settings.embedding_dimensions)})"
+    return f"""
+        SELECT {columns}, embedding <-> :embedding AS distance
+        FROM (
+            SELECT {columns}, embedding
+            FROM faqs
+            WHERE embedding IS NOT NULL
+              AND (CAST(:category AS text) IS NULL OR category = :category)
+            ORDER BY binary_quantize(embedding)::{bits} <~> binary_quantize(CAST(:embedding AS {embedding_type}))::{bits}
+            LIMIT GREATEST({int(settings.binary_prefilter_candidates)}, {limit})
+        ) faqs
+        ORDER BY distance
+        LIMIT {limit}
+    """
+
+
+# Constant statement text so asyncpg's prepared statement cache reuses the plan across searches.
+# The query vector is a bound parameter sent in binary and the distance is computed once.
+SEARCH_BY_EMBEDDING_SQL = text(nearest_faqs_sql("id, question, answer, category", ":limit"))
+
+# Hybrid search: the nearest vector candidates and the best full-text candidates are fused with
+# reciprocal rank fusion, score = sum(1 / (rrf_k + rank)), so a row found by both ranks highest.
+HYBRID_SEARCH_SQL = text(f"""
+    WITH vector_hits AS (
+        SELECT id, distance, row_number() OVER (ORDER BY distance) AS rank
+        FROM ({nearest_faqs_sql("id", ":candidates")}) nearest
+    ),
+    lexical_hits AS (
+        SELECT id, row_number() OVER (ORDER BY ts_rank_cd(search_vector, query) DESC) AS rank
+        FROM faqs, websearch_to_tsquery('english', :query) AS query
+        WHERE search_vector @@ query
+          AND (CAST(:category AS text) IS NULL OR category = :category)
+        ORDER BY ts_rank_cd(search_vector, query) DESC
+        LIMIT :candidates
+    )
+    SELECT faqs.id, faqs.question, faqs.answer, faqs.category, vector_hits.distance,
+           COALESCE(1.0 / (:rrf_k + vector_hits.rank), 0) + COALESCE(1.0 / (:rrf_k + lexical_hits.rank), 0) AS score
+    FROM vector_hits
+    FULL OUTER JOIN lexical_hits ON lexical_hits.id = vector_hits.id
+    JOIN faqs ON faqs.id = COALESCE(vector_hits.id, lexical_hits.id)
+    ORDER BY score DESC, vector_hits.distance
+    LIMIT :limit
+""")
+
 
 class DataconnectionFaq:
     """Class for managing FAQ operations."""
     
+    @staticmethod
+    def _list_query(category: str = None, cursor: int = None, limit: int = None):
+        """Build a keyset-paginated FAQ listing that selects only the text columns, never embeddings."""
+        
+        query = select(Faq.id, Faq.question, Faq.answer, Faq.category).order_by(Faq.id)
+        if category is not None:
+            query = query.where(Faq.category == category)
+        if cursor is not None:
+            query = query.where(Faq.id > cursor)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+    
     @classmethod
-    async def get_faqs(cls):
-        """Retrieve all FAQs from the database."""
+    async def get_faqs(cls, cursor: int = None, limit: int = None):
+        """Retrieve FAQs ordered by ID, starting after `cursor` and returning at most `limit` rows."""
         
-        with get_session() as session:
-            faqs = session.query(Faq).all()
-            return [{"question": faq.question, "answer": faq.answer, "category": faq.category} for faq in faqs]
+        async with get_session() as session:
+            result = await session.execute(cls._list_query(cursor=cursor, limit=limit))
+            return [dict(row) for row in result.mappings()]
     
     @classmethod
-    async def get_faq_by_category(cls, category: str):
-        """Retrieve FAQs by category."""
+    async def get_faq_by_category(cls, category: str, cursor: int = None, limit: int = None):
+        """Retrieve FAQs by category, starting after `cursor` and returning at most `limit` rows."""
         
-        with get_session() as session:
-            faqs = session.query(Faq).filter(Faq.category == category).all()
-            return [{"question": faq.question, "answer": faq.answer} for faq in faqs]
+        async with get_session() as session:
+            result = await session.execute(cls._list_query(category=category, cursor=cursor, limit=limit))
+            return [{"id": row.id, "question": row.question, "answer": row.answer} for row in result]
+    
+    @classmethod
+    async def stream_faqs(cls, category: str = None, batch_size: int = 500):
+        """Stream every FAQ through a server-side cursor without building the full list in memory."""
+        
+        async with get_session() as session:
+            result = await session.stream(
+                cls._list_query(category=category).execution_options(yield_per=batch_size)
+            )
+            async for row in result.mappings():
+                yield dict(row)
+    
+    @classmethod
+    async def stream_faq_embeddings(cls, batch_size: int = 1000):
+        """Stream every embedded FAQ with its embedding, e.g. to build an in-memory index."""
+        
+        async with get_session() as session:
+            result = await session.stream(
+                select(Faq.id, Faq.question, Faq.answer, Faq.category, Faq.embedding)
+                .where(Faq.embedding.is_not(None))
+                .execution_options(yield_per=batch_size)
+            )
+            async for row in result.mappings():
+                yield dict(row)
+    
+    @classmethod
+    async def get_faq_embeddings(cls, faq_ids: list[int]) -> list[dict]:
+        """Retrieve the given FAQs with their embeddings; missing ids are left out."""
+        
+        async with get_session() as session:
+            result = await session.execute(
+                select(Faq.id, Faq.question, Faq.answer, Faq.category, Faq.embedding).where(Faq.id.in_(faq_ids))
+            )
+            return [dict(row) for row in result.mappings()]
     
     @classmethod
     async def get_faq_by_id(cls, faq_id: int):
         """Retrieve a specific FAQ by its ID."""
         
-        with get_session() as session:
-            faq = session.query(Faq).filter(Faq.id == faq_id).first()
+        async with get_session() as session:
+            faq = await session.get(Faq, faq_id)
             if faq:
                 return {"question": faq.question, "answer": faq.answer, "category": faq.category}
             else:
@@ -138,18 +764,50 @@ class DataconnectionFaq:
     async def add_faq(cls, question: str, answer: str, category: str = None, embedding: list[float] = None):
         """Add a new FAQ to the database."""
         
-        with get_session() as session:
-            new_faq = Faq(question=question, answer=answer, category=category, embedding=embedding)
+        async with get_session() as session:
+            new_faq = Faq(
+                question=question,
+                answer=answer,
+                category=category,
+                embedding=embedding,
+                embedding_hash=faq_content_hash(question, answer) if embedding is not None else None,
+            )
             session.add(new_faq)
-            session.commit()
+            try:
+                await session.commit()
+            except IntegrityError:
+                raise DuplicateFaq("An FAQ with this question and answer already exists")
             return {"id": new_faq.id, "question": new_faq.question, "answer": new_faq.answer, "category": new_faq.category}
 
+    @classmethod
+    async def existing_content_hashes(cls, hashes: list[str]) -> set[str]:
+        """Return the subset of the given content hashes that are already stored."""
+        
+        async with get_session() as session:
+            result = await session.scalars(select(Faq.content_hash).where(Faq.content_hash.in_(hashes)))
+            return set(result)
+
+    @classmethod
+    async def bulk_add_faqs(cls, faqs: list[dict]) -> int:
+        """
+        Insert many FAQs with a multi-row INSERT in a single transaction and return how many were inserted.
+        Rows whose question and answer are already stored, e.g. by a concurrent import, are skipped.
+        """
+        
+        if not faqs:
+            return 0
+        async with get_session() as session:
+            result = await session.execute(pg_insert(Faq).on_conflict_do_nothing().returning(Faq.id), faqs)
+            inserted = len(result.all())
+            await session.commit()
+        return inserted
+
     @classmethod
     async def update_faq(cls, faq_id: int, question: str = None, answer: str = None, category: str = None):
         """Update an existing FAQ in the database."""
         
-        with get_session() as session:
-            faq = session.query(Faq).filter(Faq.id == faq_id).first()
+        async with get_session() as session:
+            faq = await session.get(Faq, faq_id)
             if faq:
                 if question:
                     faq.question = question
@@ -157,43 +815,175 @@ class DataconnectionFaq:
                     faq.answer = answer
                 if category:
                     faq.category = category
-                session.commit()
-                session.refresh(faq)
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    raise DuplicateFaq("An FAQ with this question and answer already exists")
+                await session.refresh(faq)
                 return {"id": faq.id, "question": faq.question, "answer": faq.answer, "category": faq.category}
             else:
                 return None
     
+    @classmethod
+    async def stale_embeddings(cls, after_id: int = 0, limit: int = 100) -> list[dict]:
+        """Retrieve FAQs whose stored embedding no longer matches their question and answer."""
+        
+        async with get_session() as session:
+            result = await session.execute(
+                select(Faq.id, Faq.question, Faq.answer)
+                .where(Faq.id > after_id, STALE_EMBEDDING_CONDITION)
+                .order_by(Faq.id)
+                .limit(limit)
+            )
+            return [dict(row) for row in result.mappings()]
+
+    @classmethod
+    async def update_embeddings(cls, rows: list[dict]):
+        """
+        Store re-computed embeddings. Each row carries the question and answer it was embedded from,
+        and is only written if the FAQ still has that content.
+        """
+        
+        if not rows:
+            return
+        stmt = (
+            update(Faq.__table__)
+            .where(
+                Faq.__table__.c.id == bindparam("faq_id"),
+                Faq.__table__.c.question == bindparam("embedded_question"),
+                Faq.__table__.c.answer == bindparam("embedded_answer"),
+            )
+            .values(embedding=bindparam("new_embedding"), embedding_hash=bindparam("new_embedding_hash"))
+        )
+        params = [
+            {
+                "faq_id": row["id"],
+                "embedded_question": row["question"],
+                "embedded_answer": row["answer"],
+                "new_embedding": row["embedding"],
+                "new_embedding_hash": faq_content_hash(row["question"], row["answer"]),
+            }
+            for row in rows
+        ]
+        async with get_async_engine().begin() as conn:
+            await conn.execute(stmt, params)
+
+    @classmethod
+    async def invalidate_embeddings(cls) -> int:
+        """Mark every FAQ embedding as stale, e.g. after switching embedding models."""
+        
+        async with get_async_engine().begin() as conn:
+            result = await conn.execute(update(Faq.__table__).values(embedding_hash=None))
+        return result.rowcount
+
     @classmethod
     async def delete_faq(cls, faq_id: int):
         """Delete an FAQ from the database by its ID."""
         
-        with get_session() as session:
-            faq = session.query(Faq).filter(Faq.id == faq_id).first()
+        async with get_session() as session:
+            faq = await session.get(Faq, faq_id)
             if faq:
-                session.delete(faq)
-                session.commit()
+                await session.delete(faq)
+                await session.commit()
                 return {"message": "FAQ deleted successfully"}
             else:
                 return {"message": "FAQ not found"}
 
     @classmethod
-    async def search_by_embedding(cls, query_embedding: list[float], limit: int = 5):
+    async def knowledge_version(cls) -> int | None:
+        """Current knowledge base version, bumped on every FAQ change made by any process."""
+
+        async with get_session() as session:
+            return await session.scalar(text("SELECT version FROM faq_version WHERE id = 1"))
+
+    @classmethod
+    async def search_by_embedding(
+        cls, query_embedding: list[float], limit: int = 5, ef_search: int = None, probes: int = None, category: str = None
+    ):
         """
-        Search FAQs using vector similarity with pgvector extension
+        Search FAQs using vector similarity with pgvector extension, optionally within one category.
+        ef_search (HNSW) and probes (IVFFlat) override the configured recall/speed trade-off for this query.
         """
         
-        with get_session() as session:
-            # Convert list to string format for PostgreSQL vector casting
-            embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-            
-            # Use pgvector's cosine distance for similarity search
-            # Note: Using string formatting here since SQLAlchemy has issues with vector type casting
-            sql = text(f"""
-            SELECT question, answer, category, embedding <-> '{embedding_str}'::vector as distance
-            FROM faqs
-            WHERE embedding IS NOT NULL
-            ORDER BY embedding <-> '{embedding_str}'::vector
-            LIMIT :limit
-            """)
-            result = session.execute(sql, {"limit": limit})
-            return [{"question": r[0], "answer": r[1], "category": r[2], "distance": r[3]} for r in result]
+        with track_stage("vector_search"):
+            async with get_session() as session:
+                await apply_search_settings(session, ef_search=ef_search, probes=probes, filtered=category is not None)
+                
+                result = await session.execute(
+                    SEARCH_BY_EMBEDDING_SQL, {"embedding": query_embedding, "limit": limit, "category": category}
+                )
+                rows = [{"id": r[0], "question": r[1], "answer": r[2], "category": r[3], "distance": r[4]} for r in result]
+                return sorted(rows, key=lambda row: row["distance"])
+
+    @classmethod
+    async def hybrid_search(
+        cls, query: str, query_embedding: list[float], limit: int = 5, category: str = None, candidates: int = None
+    ):
+        """
+        Search FAQs by combining vector similarity and full-text matches with reciprocal rank fusion,
+        so exact terms such as error codes or plan names are found even when embeddings miss them.
+        """
+        
+        with track_stage("hybrid_search"):
+            async with get_session() as session:
+                await apply_search_settings(session, filtered=category is not None)
+                
+                result = await session.execute(
+                    HYBRID_SEARCH_SQL,
+                    {
+                        "query": query,
+                        "embedding": query_embedding,
+                        "limit": limit,
+                        "category": category,
+                        "candidates": max(candidates or settings.hybrid_search_candidates, limit),
+                        "rrf_k": settings.hybrid_search_rrf_k,
+                    },
+                )
+                return [
+                    {"id": r[0], "question": r[1], "answer": r[2], "category": r[3], "distance": r[4], "score": float(r[5])}
+                    for r in result
+                ]
+
+    @classmethod
+    async def search(cls, query: str, query_embedding: list[float], limit: int = 5, category: str = None):
+        """
+        Search FAQs with the configured retrieval mode ('hybrid' or 'vector'). Vector-only searches are
+        answered from the in-memory index when FAQ_SEARCH_BACKEND is 'memory' and the index is loaded.
+        """
+        
+        if settings.faq_search_mode == "hybrid":
+            return await cls.hybrid_search(query, query_embedding, limit=limit, category=category)
+        if settings.faq_search_backend == "memory":
+            from app.vector_index import faq_index
+            if faq_index.ready:
+                return faq_index.search(query_embedding, limit=limit, category=category)
+        return await cls.search_by_embedding(query_embedding, limit=limit, category=category)
+
+    @classmethod
+    async def rebuild_vector_index(cls):
+        """
+        Recreate the ANN indexes on faqs.embedding using the current settings without blocking reads or writes:
+        each new index is built CONCURRENTLY under a temporary name, then swapped in for the old one.
+        """
+        
+        async with try_advisory_lock(VECTOR_INDEX_BUILD_LOCK) as acquired:
+            if not acquired:
+                raise RuntimeError("Another vector index build or rebuild is already running")
+            # CONCURRENTLY cannot run inside a transaction block
+            async with get_async_engine().connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                built = {}
+                for index, build_ddl in ((FAQ_EMBEDDING_INDEX, vector_index_ddl), (FAQ_EMBEDDING_BINARY_INDEX, binary_index_ddl)):
+                    temporary = f"{index}_rebuild"
+                    # An interrupted rebuild leaves an invalid index behind
+                    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {temporary}"))
+                    ddl = build_ddl(temporary, concurrently=True)
+                    if ddl:
+                        await conn.execute(text(ddl))
+                    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+                    if ddl:
+                        await conn.execute(text(f"ALTER INDEX {temporary} RENAME TO {index}"))
+                    built[index] = ddl is not None
+        schema_status["vector_index"] = settings.faq_vector_index if built[FAQ_EMBEDDING_INDEX] else None
+        schema_status["binary_prefilter"] = built[FAQ_EMBEDDING_BINARY_INDEX]
+        return {"message": "Vector index rebuilt successfully", "index_type": settings.faq_vector_index}
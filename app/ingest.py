@@ -0,0 +1,174 @@
+import asyncio
+import csv
+import json
+from collections.abc import AsyncIterator, Iterable, Iterator
+from typing import TextIO
+from app.agent import generate_embeddings
+from app.config import settings
+from app.database import DataconnectionFaq, faq_content_hash, try_advisory_lock
+
+
+def iter_faq_records(stream: TextIO, format: str) -> Iterator[dict]:
+    """Lazily parse FAQ records from a JSONL or CSV text stream with question, answer and category fields."""
+
+    if format == "csv":
+        yield from csv.DictReader(stream)
+    elif format == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                # Anything but a JSON object is yielded empty, so it is counted as invalid
+                yield record if isinstance(record, dict) else {}
+    else:
+        raise ValueError(f"Unsupported import format {format!r}, expected 'jsonl' or 'csv'")
+
+
+def _batches(records: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def import_faqs(records: Iterable[dict], batch_size: int = 256) -> AsyncIterator[dict]:
+    """
+    Import FAQs in batches, yielding a progress report after each committed batch.
+    Rows whose question/answer are already stored are skipped without being re-embedded,
+    so a failed import can simply be run again with the same input.
+    """
+
+    progress = {"processed": 0, "inserted": 0, "skipped": 0, "invalid": 0}
+
+    for batch in _batches(records, batch_size):
+        progress["processed"] += len(batch)
+
+        rows = {}
+        for record in batch:
+            question = str(record.get("question") or "").strip()
+            answer = str(record.get("answer") or "").strip()
+            if not question or not answer:
+                progress["invalid"] += 1
+                continue
+            content_hash = faq_content_hash(question, answer)
+            if content_hash in rows:
+                progress["skipped"] += 1
+                continue
+            rows[content_hash] = {
+                "question": question,
+                "answer": answer,
+                "category": record.get("category") or None,
+                "embedding_hash": content_hash,
+            }
+
+        existing = await DataconnectionFaq.existing_content_hashes(list(rows))
+        progress["skipped"] += len(existing)
+        new_rows = [row for content_hash, row in rows.items() if content_hash not in existing]
+
+        embeddings = await generate_embeddings([f"{row['question']}\n{row['answer']}" for row in new_rows], cache=False)
+        for row, embedding in zip(new_rows, embeddings):
+            row["embedding"] = embedding
+
+        inserted = await DataconnectionFaq.bulk_add_faqs(new_rows)
+        progress["inserted"] += inserted
+        progress["skipped"] += len(new_rows) - inserted
+        yield dict(progress)
+
+
+class ReembeddingWorker:
+    """
+    Background worker that re-embeds FAQs whose content changed since their embedding was computed.
+    The stored embedding hash is the durable queue: stale rows are found again after a restart.
+    Every API worker runs one, but an advisory lock lets only one of them process the queue at a time.
+    A worker that finds the lock taken, e.g. when woken by an update while another process is mid-run, retries
+    after `busy_retry_seconds` instead of waiting for its next regular tick.
+    """
+
+    busy_retry_seconds = 5
+
+    def __init__(self, batch_size: int, interval_seconds: float):
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.reembedded = 0
+        self.last_error = None
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Start the worker loop on the running event loop."""
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the worker loop and wait for it to finish."""
+
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Wake the worker early, e.g. right after an FAQ was updated."""
+
+        self._wake.set()
+
+    async def run_once(self) -> int | None:
+        """
+        Re-embed all currently stale FAQs in batches and return how many were processed.
+        Returns None straight away if another process is already re-embedding.
+        """
+
+        processed = 0
+        async with try_advisory_lock("faqs re-embedding") as acquired:
+            if not acquired:
+                return None
+            after_id = 0
+            while rows := await DataconnectionFaq.stale_embeddings(after_id=after_id, limit=self.batch_size):
+                embeddings = await generate_embeddings([f"{row['question']}\n{row['answer']}" for row in rows], cache=False)
+                for row, embedding in zip(rows, embeddings):
+                    row["embedding"] = embedding
+                await DataconnectionFaq.update_embeddings(rows)
+                processed += len(rows)
+                after_id = rows[-1]["id"]
+        self.reembedded += processed
+        return processed
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            timeout = self.interval_seconds
+            try:
+                if await self.run_once() is None:
+                    # The other process may already be past the rows this worker was woken for
+                    timeout = min(timeout, self.busy_retry_seconds)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Warning: FAQ re-embedding failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        """Worker state for the health endpoint."""
+
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "reembedded": self.reembedded,
+            "last_error": self.last_error,
+        }
+
+
+reembedding_worker = ReembeddingWorker(settings.reembed_batch_size, settings.reembed_interval_seconds)
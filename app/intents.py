@@ -0,0 +1,149 @@
+import re
+import numpy as np
+from prometheus_client import Counter
+from app.config import settings
+from app.models import QueryRequest, QueryResponse
+
+
+FAST_PATH_QUERIES = Counter("supportagent_fast_path_queries_total", "Queries seen by the intent router, by routed intent", ["intent"])
+
+# High-precision patterns, matched against the whole normalized question so compound questions go to the agent
+INTENT_RULES = {
+    "subscription_plan": [
+        r"(what|which) (plan|subscription|subscription plan|tier) (am i on|am i in|do i have|am i subscribed to|am i using)",
+        r"what is my (current )?(plan|subscription|subscription plan|tier)",
+        r"(am i|am i currently) on (the )?(free|basic|premium|enterprise)( plan| tier)?",
+        r"(check|show|tell me) my (current )?(plan|subscription|subscription plan)",
+        r"my (current )?(plan|subscription plan)",
+    ],
+    "account_status": [
+        r"is my account (still |currently )?(active|inactive|suspended|enabled|disabled|ok|working)",
+        r"(has|was) my account (been )?(suspended|deactivated|disabled|closed)",
+        r"what is (my|the) (current )?(account status|status of my account)",
+        r"(check|show|tell me) my (current )?account status",
+        r"(my )?account status",
+    ],
+}
+
+# Example phrasings for the embedding-similarity classifier
+INTENT_EXAMPLES = {
+    "subscription_plan": [
+        "What plan am I on?",
+        "Which subscription do I have?",
+        "What is my current subscription plan?",
+        "Am I on the premium plan?",
+        "Tell me my plan tier",
+    ],
+    "account_status": [
+        "Is my account active?",
+        "What is my account status?",
+        "Has my account been suspended?",
+        "Is my account still working?",
+        "Check whether my account is enabled",
+    ],
+}
+
+_COMPILED_RULES = {intent: [re.compile(f"^{p}$") for p in patterns] for intent, patterns in INTENT_RULES.items()}
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, expand common contractions and strip greetings, politeness and punctuation."""
+
+    text = text.lower().replace("what's", "what is").replace("whats", "what is").replace("i'm", "i am")
+    text = re.sub(r"[^a-z0-9 ]+", " ", text)
+    text = re.sub(r"^(hi|hello|hey)( there)? ", "", " ".join(text.split()))
+    text = re.sub(r"\b(please|pls|can you|could you)\b", " ", text)
+    return " ".join(text.split())
+
+
+def answer_intent(intent: str, profile: dict) -> dict:
+    """Compose the deterministic answer for an intent from the user's profile row."""
+
+    name = profile["name"]
+    if intent == "subscription_plan":
+        plan = profile["subscription_plan"]
+        return {
+            "support_advice": f"Hi {name}, you're currently on the {plan.capitalize()} plan.",
+            "escalation_required": False,
+            "risk_level": 0,
+        }
+    status = profile["account_status"]
+    if status == "active":
+        advice = f"Hi {name}, your account is active and in good standing."
+    else:
+        advice = f"Hi {name}, your account is currently {status}. If you think this is a mistake, please contact our support team."
+    return {"support_advice": advice, "escalation_required": False, "risk_level": 0 if status == "active" else 3}
+
+
+class IntentRouter:
+    """
+    Pre-router that answers deterministic account questions (plan, account status) straight from the
+    users table. Everything it doesn't recognize with high confidence goes to the agent.
+    """
+
+    def __init__(self, mode: str, threshold: float):
+        self.mode = mode
+        self.threshold = threshold
+        self.hits: dict[str, int] = {intent: 0 for intent in INTENT_RULES}
+        self.misses = 0
+        self._examples: tuple[np.ndarray, list[str]] | None = None
+
+    def classify_rules(self, text: str) -> str | None:
+        question = normalize_question(text)
+        for intent, patterns in _COMPILED_RULES.items():
+            if any(pattern.match(question) for pattern in patterns):
+                return intent
+        return None
+
+    async def _example_matrix(self) -> tuple[np.ndarray, list[str]]:
+        if self._examples is None:
+            from app.agent import generate_embeddings
+
+            labels = [intent for intent, examples in INTENT_EXAMPLES.items() for _ in examples]
+            embeddings = await generate_embeddings([e for examples in INTENT_EXAMPLES.values() for e in examples])
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            self._examples = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True), labels)
+        return self._examples
+
+    async def classify(self, text: str, query_embedding: list[float] = None) -> str | None:
+        """Return the recognized intent, or None when the question should go to the agent."""
+
+        if self.mode == "off":
+            return None
+        intent = self.classify_rules(text)
+        if intent or self.mode != "embedding":
+            return intent
+
+        from app.agent import generate_embedding
+
+        matrix, labels = await self._example_matrix()
+        query = np.asarray(query_embedding if query_embedding is not None else await generate_embedding(text), dtype=np.float32)
+        similarities = matrix @ (query / np.linalg.norm(query))
+        best = int(np.argmax(similarities))
+        return labels[best] if similarities[best] >= self.threshold else None
+
+    async def answer(self, request: QueryRequest, profile: dict | None, query_embedding: list[float] = None) -> QueryResponse | None:
+        """Answer the query without the agent if it is a recognized deterministic intent."""
+
+        intent = await self.classify(request.query, query_embedding) if profile else None
+        FAST_PATH_QUERIES.labels(intent or "none").inc()
+        if intent is None:
+            self.misses += 1
+            return None
+        self.hits[intent] += 1
+        return QueryResponse(user_id=request.user_id, query=request.query, **answer_intent(intent, profile))
+
+    def stats(self) -> dict:
+        """Hit counts and hit rate, for the health endpoint."""
+
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+intent_router = IntentRouter(settings.fast_path_mode, settings.fast_path_similarity_threshold)
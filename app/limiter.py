@@ -0,0 +1,180 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from pydantic_ai.exceptions import ModelHTTPError
+from app.config import settings
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class UpstreamOverloaded(Exception):
+    """Raised when an upstream call cannot get a slot before its deadline or the wait queue is full."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamLimiter:
+    """
+    Concurrency and token-rate limiter for OpenAI calls, with a bounded wait queue,
+    queueing deadlines and retries with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        tokens_per_minute: int = 0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.retries = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._token_lock = asyncio.Lock()
+
+    async def _take_tokens(self, tokens: int, deadline: float):
+        """Wait until the token bucket can cover this call, or give up at the deadline."""
+
+        if not self.tokens_per_minute or not tokens:
+            return
+        tokens = min(tokens, self.tokens_per_minute)
+        rate = self.tokens_per_minute / 60
+        async with self._token_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * rate)
+                self._refilled_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / rate
+                if now + wait > deadline:
+                    raise UpstreamOverloaded(f"{self.name} token budget exhausted", retry_after=wait)
+                await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """Hold one concurrency slot (and `tokens` of rate budget) for the duration of an upstream call."""
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise UpstreamOverloaded(f"{self.name} queue is full", retry_after=self.queue_timeout)
+
+        deadline = time.monotonic() + self.queue_timeout
+        self.waiting += 1
+        try:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except TimeoutError:
+                self.rejected += 1
+                raise UpstreamOverloaded(f"{self.name} queue deadline exceeded", retry_after=self.queue_timeout)
+            try:
+                await self._take_tokens(tokens, deadline)
+            except UpstreamOverloaded:
+                self._semaphore.release()
+                self.rejected += 1
+                raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float | None:
+        """Backoff before the next attempt, or None when the error is not worth retrying."""
+
+        from openai import APIConnectionError, APIStatusError
+
+        cause = error.__cause__ if isinstance(error, ModelHTTPError) else error
+        if isinstance(error, ModelHTTPError):
+            status_code = error.status_code
+        elif isinstance(error, APIStatusError):
+            status_code = error.status_code
+        elif isinstance(error, APIConnectionError):
+            status_code = None
+        else:
+            return None
+        if status_code is not None and status_code not in RETRYABLE_STATUS_CODES:
+            return None
+
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(cause, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def call(self, fn, *args, tokens: int = 0, **kwargs):
+        """Run an upstream coroutine function inside a slot, retrying transient failures."""
+
+        for attempt in range(self.max_retries + 1):
+            async with self.slot(tokens):
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None or attempt == self.max_retries:
+                        raise
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Current load and counters, for health and metrics endpoints."""
+
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "rejected": self.rejected,
+            "retries": self.retries,
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token) for rate budgeting."""
+
+    return len(text) // 4 + 1
+
+
+chat_limiter = UpstreamLimiter(
+    "chat",
+    settings.openai_chat_max_concurrency,
+    settings.openai_max_queue,
+    settings.openai_queue_timeout_seconds,
+    settings.openai_chat_tokens_per_minute,
+    settings.openai_max_retries,
+)
+embedding_limiter = UpstreamLimiter(
+    "embeddings",
+    settings.openai_embedding_max_concurrency,
+    settings.openai_max_queue,
+    settings.openai_queue_timeout_seconds,
+    settings.openai_embedding_tokens_per_minute,
+    settings.openai_max_retries,
+)
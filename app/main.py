@@ -1,6 +1,22 @@
-from fastapi import FastAPI
+import asyncio
+import math
+import random
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import agent_router, faq_router
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.agent import warm_up_model
+from app.api import agent_router, faq_router, admin_router
+from app.batch import batch_jobs
+from app.database import dispose_engines, ensure_tables_exist, pool_status, schema_status
+from app.cache import embedding_cache, response_cache
+from app.config import settings
+from app.ingest import reembedding_worker
+from app.intents import intent_router
+from app.limiter import UpstreamOverloaded, chat_limiter, embedding_limiter
+from app.metrics import format_server_timing, start_server_timing, track_stage
+from app.vector_index import faq_index
 
 
 description = """
@@ -37,7 +53,53 @@ An intelligent support agent built with **OpenAI GPT-4** and **RAG (Retrieval-Au
 """
 
 
+async def start_background_workers():
+    if settings.reembed_enabled:
+        reembedding_worker.start()
+    if settings.faq_search_backend == "memory":
+        await faq_index.start()
+
+
+async def retry_schema_bootstrap():
+    """Retry the schema bootstrap with jittered exponential backoff, then start the background workers."""
+    
+    delay = settings.schema_retry_initial_seconds
+    while True:
+        await asyncio.sleep(delay * random.uniform(0.5, 1))
+        if await ensure_tables_exist():
+            break
+        delay = min(delay * 2, settings.schema_retry_max_seconds)
+    await start_background_workers()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Verify the database schema at startup, run background workers and release the pool on shutdown."""
+    
+    # The OpenAI client is imported and built in the background: readiness doesn't wait for it, the first query rarely does
+    warm_up = asyncio.create_task(asyncio.to_thread(warm_up_model))
+    bootstrap = None
+    if await ensure_tables_exist():
+        await start_background_workers()
+    else:
+        # /health reports "degraded" (503) until a retry succeeds
+        bootstrap = asyncio.create_task(retry_schema_bootstrap())
+    yield
+    if bootstrap:
+        bootstrap.cancel()
+        try:
+            await bootstrap
+        except asyncio.CancelledError:
+            pass
+    await batch_jobs.shutdown()
+    await reembedding_worker.stop()
+    await faq_index.stop()
+    await warm_up
+    await dispose_engines()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="SupportAgent API",
     description=description,
     version="1.0.0",
@@ -58,6 +120,10 @@ app = FastAPI(
             "name": "FAQ",
             "description": "FAQ management system with vector embeddings for semantic search and content management.",
         },
+        {
+            "name": "Admin",
+            "description": "Operational actions such as rebuilding the FAQ vector index.",
+        },
         {
             "name": "System",
             "description": "System health checks and general information endpoints.",
@@ -75,6 +141,27 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Time every request and optionally report the stage breakdown in a Server-Timing header."""
+    timings = start_server_timing()
+    with track_stage("request"):
+        response = await call_next(request)
+    if settings.server_timing_enabled:
+        response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+
+@app.exception_handler(UpstreamOverloaded)
+async def upstream_overloaded_handler(request: Request, exc: UpstreamOverloaded):
+    """Shed load quickly with a 503 and a Retry-After hint when OpenAI calls cannot be queued."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Service overloaded: {exc}"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
 @app.get("/", tags=["System"])
 async def root():
     """Root endpoint to verify API is running and provide basic information."""
@@ -95,20 +182,38 @@ async def root():
 
 
 @app.get("/health", tags=["System"])
-async def health_check():
+async def health_check(response: Response):
     """Health check endpoint to verify API status and version information."""
+    if not schema_status["ready"]:
+        response.status_code = 503
     return {
-        "status": "healthy", 
+        "status": "healthy" if schema_status["ready"] else "degraded", 
         "service": "supportagent-api",
         "version": "1.0.0",
         "ai_model": "gpt-4-turbo",
         "embedding_model": "text-embedding-3-small",
-        "database": "postgresql+pgvector"
+        "database": "postgresql+pgvector",
+        "schema": schema_status,
+        "database_pool": pool_status(),
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "reembedding": reembedding_worker.stats(),
+        "fast_path": intent_router.stats(),
+        "batch_queries": batch_jobs.stats(),
+        "faq_index": {"backend": settings.faq_search_backend, **faq_index.stats()},
+        "openai": {"chat": chat_limiter.stats(), "embeddings": embedding_limiter.stats()}
     }
 
 
+@app.get("/metrics", tags=["System"])
+async def metrics():
+    """Prometheus metrics: stage latencies, tool calls, token usage, pool, cache and upstream stats."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 app.include_router(agent_router)
 app.include_router(faq_router)
+app.include_router(admin_router)
 
 
 if __name__ == "__main__":
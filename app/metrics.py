@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+STAGE_SECONDS = Histogram(
+    "supportagent_stage_duration_seconds",
+    "Latency of each stage of request handling",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+TOOL_CALLS = Counter("supportagent_tool_calls_total", "Tool calls made by the support agent", ["tool"])
+LLM_TOKENS = Counter("supportagent_llm_tokens_total", "Tokens used by support agent runs", ["kind"])
+AGENT_RUNS = Counter("supportagent_agent_runs_total", "Completed support agent runs")
+
+# Per-request stage timings, collected for the Server-Timing header
+_server_timings: ContextVar[dict | None] = ContextVar("server_timings", default=None)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block, recording it in the stage histogram and the current request's Server-Timing."""
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - started
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _server_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def start_server_timing() -> dict:
+    """Start collecting stage timings for the current request."""
+
+    timings = {}
+    _server_timings.set(timings)
+    return timings
+
+
+def format_server_timing(timings: dict) -> str:
+    """Render collected stage timings as a Server-Timing header value."""
+
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings.items())
+
+
+def record_agent_run(result):
+    """Count tool invocations and token usage of a finished pydantic-ai run."""
+
+    # Imported here so the database layer (and scripts using only it) don't load pydantic-ai
+    from pydantic_ai.messages import ModelResponse, ToolCallPart
+
+    AGENT_RUNS.inc()
+    for message in result.new_messages():
+        if isinstance(message, ModelResponse):
+            for part in message.parts:
+                if isinstance(part, ToolCallPart):
+                    TOOL_CALLS.labels(part.tool_name).inc()
+
+    usage = result.usage()
+    LLM_TOKENS.labels("request").inc(usage.request_tokens or 0)
+    LLM_TOKENS.labels("response").inc(usage.response_tokens or 0)
+
+
+class RuntimeCollector:
+    """Expose database pool, cache and upstream limiter state at scrape time."""
+
+    def describe(self):
+        # Don't collect at registration time: the modules read here import this one
+        return []
+
+    def collect(self):
+        from app.cache import embedding_cache, response_cache
+        from app.database import get_async_engine
+        from app.limiter import chat_limiter, embedding_limiter
+
+        pool = get_async_engine().pool
+        pool_gauge = GaugeMetricFamily("supportagent_db_pool_connections", "Database pool connections by state", labels=["state"])
+        pool_gauge.add_metric(["size"], pool.size())
+        pool_gauge.add_metric(["checked_out"], pool.checkedout())
+        pool_gauge.add_metric(["checked_in"], pool.checkedin())
+        pool_gauge.add_metric(["overflow"], max(pool.overflow(), 0))
+        yield pool_gauge
+
+        hits = CounterMetricFamily("supportagent_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("supportagent_cache_misses", "Cache misses", labels=["cache"])
+        for name, cache in (("embedding", embedding_cache), ("response", response_cache)):
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+        yield hits
+        yield misses
+
+        in_flight = GaugeMetricFamily("supportagent_upstream_in_flight", "OpenAI calls in flight", labels=["upstream"])
+        waiting = GaugeMetricFamily("supportagent_upstream_waiting", "OpenAI calls waiting for a slot", labels=["upstream"])
+        rejected = CounterMetricFamily("supportagent_upstream_rejected", "OpenAI calls rejected by backpressure", labels=["upstream"])
+        retries = CounterMetricFamily("supportagent_upstream_retries", "OpenAI calls retried after a transient error", labels=["upstream"])
+        for limiter in (chat_limiter, embedding_limiter):
+            stats = limiter.stats()
+            in_flight.add_metric([limiter.name], stats["in_flight"])
+            waiting.add_metric([limiter.name], stats["waiting"])
+            rejected.add_metric([limiter.name], stats["rejected"])
+            retries.add_metric([limiter.name], stats["retries"])
+        yield from (in_flight, waiting, rejected, retries)
+
+
+REGISTRY.register(RuntimeCollector())
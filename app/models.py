@@ -1,9 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class QueryRequest(BaseModel):
     """Request model for submitting a support query to the AI agent."""
     user_id: int
     query: str
+    session_id: str | None = Field(default=None, max_length=128)  # Continue a conversation: earlier turns are passed to the agent
+    preretrieval: bool | None = None  # Retrieve FAQs before the agent run instead of via the tool; None uses FAQ_PRERETRIEVAL
+
+class BatchQueryRequest(BaseModel):
+    """Request model for submitting many support queries as one batch job."""
+    queries: list[QueryRequest]
 
 class QueryResponse(BaseModel):
     """Response model for the AI agent's support query response."""
@@ -12,6 +18,7 @@ class QueryResponse(BaseModel):
     support_advice: str
     escalation_required: bool
     risk_level: int
+    session_id: str | None = Field(default=None, max_length=128)
     
 
 class FaqCreateRequest(BaseModel):
@@ -0,0 +1,97 @@
+import zlib
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    UserPromptPart,
+)
+from app.config import settings
+from app.database import DataconnectionConversation
+from app.limiter import estimate_tokens
+
+
+def split_turns(messages: list[ModelMessage]) -> list[list[ModelMessage]]:
+    """Split a message history into turns, each starting with the request that carries a user prompt."""
+
+    turns = []
+    for message in messages:
+        if not turns or (isinstance(message, ModelRequest) and any(isinstance(p, UserPromptPart) for p in message.parts)):
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def compact_turn(turn: list[ModelMessage]) -> list[ModelMessage]:
+    """
+    Reduce a past turn to the user's question and the advice given, dropping tool calls and
+    their (often long) results such as retrieved FAQ text.
+    """
+
+    prompts = [p for m in turn if isinstance(m, ModelRequest) for p in m.parts if isinstance(p, UserPromptPart)]
+    answer = ""
+    for message in turn:
+        if isinstance(message, ModelResponse):
+            for part in message.parts:
+                if isinstance(part, TextPart) and part.content:
+                    answer = part.content
+                elif isinstance(part, ToolCallPart) and "support_advice" in part.args_as_dict():
+                    answer = part.args_as_dict()["support_advice"]
+    if not prompts or not answer:
+        return []
+    return [ModelRequest(parts=prompts[:1]), ModelResponse(parts=[TextPart(content=answer)])]
+
+
+def history_tokens(messages: list[ModelMessage]) -> int:
+    return estimate_tokens(ModelMessagesTypeAdapter.dump_json(messages).decode())
+
+
+def trim_history(messages: list[ModelMessage], max_tokens: int, full_turns: int = 1) -> list[ModelMessage]:
+    """
+    Keep the newest `full_turns` turns verbatim, compact older ones to question/answer pairs and drop
+    the oldest turns until the history fits in `max_tokens`. The system prompt is always kept.
+    """
+
+    system_parts = [p for m in messages[:1] if isinstance(m, ModelRequest) for p in m.parts if isinstance(p, SystemPromptPart)]
+    turns = split_turns(messages)
+    recent = turns[-full_turns:] if full_turns > 0 else []
+    turns = [compact_turn(turn) for turn in turns[:len(turns) - len(recent)]] + recent
+    turns = [turn for turn in turns if turn]
+
+    def assemble(turns):
+        history = [message for turn in turns for message in turn]
+        if history and system_parts:
+            first = history[0]
+            parts = [p for p in first.parts if not isinstance(p, SystemPromptPart)]
+            history[0] = ModelRequest(parts=[*system_parts, *parts], instructions=first.instructions)
+        return history
+
+    history = assemble(turns)
+    while len(turns) > 1 and history_tokens(history) > max_tokens:
+        turns = turns[1:]
+        history = assemble(turns)
+    if history_tokens(history) > max_tokens and recent:
+        # Even the latest turn alone is over budget: keep only its question and answer
+        history = assemble([compact_turn(turns[-1])] if compact_turn(turns[-1]) else [])
+    return history
+
+
+async def load_history(session_id: str, user_id: int) -> list[ModelMessage]:
+    """Load a conversation's message history; unknown or expired sessions start empty."""
+
+    data = await DataconnectionConversation.get_history(session_id, user_id, settings.session_ttl_seconds)
+    if not data:
+        return []
+    return ModelMessagesTypeAdapter.validate_json(zlib.decompress(data))
+
+
+async def save_history(session_id: str, user_id: int, messages: list[ModelMessage]):
+    """Trim and store a conversation's message history, compressed."""
+
+    history = trim_history(messages, settings.session_history_max_tokens, settings.session_full_turns)
+    await DataconnectionConversation.save_history(
+        session_id, user_id, zlib.compress(ModelMessagesTypeAdapter.dump_json(history)), settings.session_ttl_seconds
+    )
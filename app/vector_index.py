@@ -0,0 +1,251 @@
+import asyncio
+import numpy as np
+from app.config import settings
+from app.database import FAQ_CHANGES_CHANNEL, DataconnectionFaq
+from app.metrics import track_stage
+
+
+class InMemoryVectorIndex:
+    """
+    Exact cosine top-k search over every FAQ embedding held in one contiguous NumPy matrix,
+    optionally int8-quantized (4x less memory, slightly lower precision). Kept in sync with
+    the faqs table through LISTEN/NOTIFY; when the listener connection drops, the index stops
+    serving, reconnects and reloads in full, since notifications may have been missed.
+    """
+
+    def __init__(self, quantization: str = "float32"):
+        if quantization not in ("float32", "int8"):
+            raise ValueError(f"Unsupported quantization {quantization!r}, expected 'float32' or 'int8'")
+        self.quantization = quantization
+        self.ready = False
+        self.last_error = None
+        self._matrix: np.ndarray | None = None
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._category_codes = np.zeros(0, dtype=np.int32)
+        self._categories: dict[str | None, int] = {}
+        self._rows: dict[int, int] = {}
+        self._faqs: list[dict] = []
+        self._count = 0
+        self._pending: set[int] = set()
+        self._changed = asyncio.Event()
+        self._disconnected = False
+        self._listener = None
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _encode(self, embedding) -> tuple[np.ndarray, float]:
+        """Unit-normalize an embedding and, for int8, quantize it with a per-row scale."""
+
+        vector = self._normalize(embedding)
+        if self.quantization == "float32":
+            return vector, 1.0
+        peak = float(np.abs(vector).max()) or 1.0
+        return np.round(vector / peak * 127).astype(np.int8), peak / 127
+
+    def _grow(self, dimensions: int):
+        capacity = max(1024, 2 * len(self._ids))
+        dtype = np.int8 if self.quantization == "int8" else np.float32
+        matrix = np.zeros((capacity, dimensions), dtype=dtype)
+        scales = np.zeros(capacity, dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        category_codes = np.zeros(capacity, dtype=np.int32)
+        if self._matrix is not None:
+            matrix[: self._count] = self._matrix[: self._count]
+            scales[: self._count] = self._scales[: self._count]
+            ids[: self._count] = self._ids[: self._count]
+            category_codes[: self._count] = self._category_codes[: self._count]
+        self._matrix, self._scales, self._ids, self._category_codes = matrix, scales, ids, category_codes
+
+    def upsert(self, faq: dict):
+        """Add or replace one FAQ (id, question, answer, category, embedding)."""
+
+        if faq.get("embedding") is None:
+            self.remove(faq["id"])
+            return
+        vector, scale = self._encode(faq["embedding"])
+        row = self._rows.get(faq["id"])
+        if row is None:
+            if self._matrix is None or self._count == len(self._ids):
+                self._grow(len(vector))
+            row = self._count
+            self._count += 1
+            self._rows[faq["id"]] = row
+            self._faqs.append({})
+        self._matrix[row] = vector
+        self._scales[row] = scale
+        self._ids[row] = faq["id"]
+        self._category_codes[row] = self._categories.setdefault(faq["category"], len(self._categories))
+        self._faqs[row] = {"id": faq["id"], "question": faq["question"], "answer": faq["answer"], "category": faq["category"]}
+
+    def remove(self, faq_id: int):
+        """Drop one FAQ, moving the last row into its slot to keep the matrix contiguous."""
+
+        row = self._rows.pop(faq_id, None)
+        if row is None:
+            return
+        last = self._count - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._scales[row] = self._scales[last]
+            self._ids[row] = self._ids[last]
+            self._category_codes[row] = self._category_codes[last]
+            self._faqs[row] = self._faqs[last]
+            self._rows[int(self._ids[row])] = row
+        self._faqs.pop()
+        self._count = last
+
+    def search(self, query_embedding: list[float], limit: int = 5, category: str = None) -> list[dict]:
+        """Return the `limit` most similar FAQs with one matrix-vector product and an argpartition."""
+
+        with track_stage("vector_search"):
+            if not self._count:
+                return []
+            similarities = self._matrix[: self._count] @ self._normalize(query_embedding)
+            if self.quantization == "int8":
+                similarities *= self._scales[: self._count]
+            if category is not None:
+                similarities[self._category_codes[: self._count] != self._categories.get(category, -1)] = -np.inf
+
+            k = min(limit, self._count)
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            return [
+                # L2 distance between unit vectors, comparable with the pgvector backend's `<->`
+                {**self._faqs[i], "distance": float(np.sqrt(max(2 - 2 * similarities[i], 0.0)))}
+                for i in top
+                if similarities[i] > -np.inf
+            ]
+
+    async def load(self, batch_size: int = 1000):
+        """Load every embedded FAQ from the database."""
+
+        self._matrix, self._count, self._rows, self._faqs, self._categories = None, 0, {}, [], {}
+        self._ids = np.zeros(0, dtype=np.int64)
+        async for faq in DataconnectionFaq.stream_faq_embeddings(batch_size=batch_size):
+            self.upsert(faq)
+        self.ready = True
+
+    async def refresh(self, faq_ids: list[int]):
+        """Re-read the given FAQs from the database, dropping the ones that no longer exist."""
+
+        found = set()
+        for faq in await DataconnectionFaq.get_faq_embeddings(faq_ids):
+            self.upsert(faq)
+            found.add(faq["id"])
+        for faq_id in set(faq_ids) - found:
+            self.remove(faq_id)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._pending.add(int(payload))
+        self._changed.set()
+
+    def _on_terminate(self, connection):
+        if connection is not self._listener:
+            return
+        self.ready = False
+        self._disconnected = True
+        self._changed.set()
+
+    async def _connect(self):
+        """Open the listener connection. LISTEN starts before any load, so no change falls in between."""
+
+        import asyncpg
+
+        self._listener = await asyncpg.connect(
+            host=settings.postgres_host,
+            port=settings.postgres_port,
+            user=settings.postgres_user,
+            password=settings.postgres_password,
+            database=settings.postgres_db,
+        )
+        self._listener.add_termination_listener(self._on_terminate)
+        await self._listener.add_listener(FAQ_CHANGES_CHANNEL, self._on_notify)
+
+    async def _reconnect(self):
+        """Re-open the listener connection and reload the whole index, retrying with exponential backoff."""
+
+        delay = 1
+        while True:
+            if self._listener:
+                self._listener.terminate()
+                self._listener = None
+            try:
+                await self._connect()
+                self._pending.clear()
+                await self.load()
+                self._disconnected = False
+                self.last_error = None
+                print(f"In-memory FAQ index reconnected and reloaded with {self._count} embeddings.")
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Warning: In-memory FAQ index reconnect failed, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def start(self):
+        """Listen for FAQ changes, load the index and keep applying changes in the background."""
+
+        try:
+            await self._connect()
+            await self.load()
+            self._task = asyncio.create_task(self._run())
+            print(f"In-memory FAQ index loaded with {self._count} embeddings.")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Warning: Could not load the in-memory FAQ index, falling back to pgvector: {e}")
+
+    async def stop(self):
+        """Stop applying changes and close the listener connection."""
+
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._listener:
+            await self._listener.close()
+            self._listener = None
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            if self._disconnected:
+                await self._reconnect()
+                continue
+            # Writes like bulk imports notify once per row, so apply them in batches
+            pending, self._pending = list(self._pending), set()
+            try:
+                for start in range(0, len(pending), 1000):
+                    await self.refresh(pending[start:start + 1000])
+                self.last_error = None
+            except Exception as e:
+                self._pending.update(pending)
+                self.last_error = str(e)
+                print(f"Warning: In-memory FAQ index refresh failed: {e}")
+                await asyncio.sleep(1)
+                self._changed.set()
+
+    def stats(self) -> dict:
+        """Index state for the health endpoint."""
+
+        return {
+            "ready": self.ready,
+            "size": self._count,
+            "quantization": self.quantization,
+            "memory_bytes": int(self._matrix.nbytes) if self._matrix is not None else 0,
+            "pending_changes": len(self._pending),
+            "last_error": self.last_error,
+        }
+
+
+faq_index = InMemoryVectorIndex(settings.memory_index_quantization)
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+from sqlalchemy import select, text
+from app.config import settings
+from app.database import DataconnectionFaq, Faq, dispose_engines, get_session
+
+
+async def sample_queries(count: int, noise: float) -> list[list[float]]:
+    """Build query vectors by perturbing randomly sampled FAQ embeddings."""
+
+    async with get_session() as session:
+        result = await session.scalars(
+            select(Faq.embedding).where(Faq.embedding.is_not(None)).order_by(text("random()")).limit(count)
+        )
+        embeddings = [np.asarray(e, dtype=np.float32) for e in result]
+
+    rng = np.random.default_rng(42)
+    return [(e + rng.normal(0, noise, e.shape).astype(np.float32)).tolist() for e in embeddings]
+
+
+async def exact_search(query_embedding: list[float], k: int) -> list[str]:
+    """Ground truth: a sequential scan with index scans disabled."""
+
+    async with get_session() as session:
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        result = await session.execute(
+            select(Faq.question).where(Faq.embedding.is_not(None)).order_by(Faq.embedding.l2_distance(query_embedding)).limit(k)
+        )
+        return [r[0] for r in result]
+
+
+async def benchmark(queries: int, k: int, values: list[int], noise: float):
+    vectors = await sample_queries(queries, noise)
+    if not vectors:
+        print("No FAQ embeddings found. Seed the database first.")
+        return
+
+    truth = [await exact_search(v, k) for v in vectors]
+    knob = "probes" if settings.faq_vector_index == "ivfflat" else "ef_search"
+
+    started = time.perf_counter()
+    for v in vectors:
+        await exact_search(v, k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(vectors)
+
+    print(f"Index: {settings.faq_vector_index}, queries: {len(vectors)}, k: {k}")
+    print(f"{'exact scan':>16} | recall@{k} 1.000 | {exact_ms:8.2f} ms/query")
+
+    for value in values:
+        hits = 0
+        started = time.perf_counter()
+        for v, expected in zip(vectors, truth):
+            rows = await DataconnectionFaq.search_by_embedding(v, limit=k, **{knob: value})
+            hits += len({r["question"] for r in rows} & set(expected))
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(vectors)
+        recall = hits / sum(len(t) for t in truth)
+        print(f"{knob + '=' + str(value):>16} | recall@{k} {recall:.3f} | {elapsed_ms:8.2f} ms/query")
+
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recall@k and latency of the FAQ ANN index against an exact scan.")
+    parser.add_argument("--queries", type=int, default=100, help="Number of query vectors to sample")
+    parser.add_argument("-k", type=int, default=5, help="Number of neighbours to compare")
+    parser.add_argument("--values", default="10,20,40,80,160", help="Comma-separated ef_search (HNSW) or probes (IVFFlat) values")
+    parser.add_argument("--noise", type=float, default=0.01, help="Gaussian noise added to sampled embeddings")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.queries, args.k, [int(v) for v in args.values.split(",")], args.noise))
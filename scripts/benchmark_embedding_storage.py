@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+from sqlalchemy import text
+from app.config import settings
+from app.database import EMBEDDING_TYPE_PATTERN, dispose_engines, get_async_engine, get_session
+
+BENCH_TABLE = "faq_embedding_bench"
+
+
+async def source_layout() -> tuple[str, int]:
+    """Storage type and dimensions of faqs.embedding, the layout every other one is compared with."""
+
+    async with get_session() as session:
+        current = await session.scalar(text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'faqs'::regclass AND attname = 'embedding' AND NOT attisdropped"
+        ))
+    match = EMBEDDING_TYPE_PATTERN.match(current or "")
+    if not match:
+        raise SystemExit(f"Unsupported faqs.embedding type {current!r}.")
+    return match.group(1), int(match.group(2))
+
+
+async def sample_queries(count: int, noise: float) -> list[np.ndarray]:
+    """Build query vectors by perturbing randomly sampled FAQ embeddings."""
+
+    async with get_session() as session:
+        result = await session.scalars(text(
+            "SELECT embedding::vector FROM faqs WHERE embedding IS NOT NULL ORDER BY random() LIMIT :count"
+        ), {"count": count})
+        embeddings = [np.asarray(e, dtype=np.float32) for e in result]
+
+    rng = np.random.default_rng(42)
+    return [e + rng.normal(0, noise, e.shape).astype(np.float32) for e in embeddings]
+
+
+async def exact_search(query: np.ndarray, k: int) -> set[int]:
+    """Ground truth: a sequential scan over the current layout with index scans disabled."""
+
+    async with get_session() as session:
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        result = await session.execute(text(
+            "SELECT id FROM faqs WHERE embedding IS NOT NULL ORDER BY embedding::vector <-> :embedding LIMIT :k"
+        ), {"embedding": query.tolist(), "k": k})
+        return {r[0] for r in result}
+
+
+def project(query: np.ndarray, dimensions: int) -> np.ndarray:
+    """Shorten a query the way stored embeddings are shortened: truncate, then re-normalize."""
+
+    if dimensions >= len(query):
+        return query
+    shortened = query[:dimensions]
+    return shortened / np.linalg.norm(shortened)
+
+
+async def build_layout(storage: str, dimensions: int, source_dimensions: int, binary: bool) -> dict:
+    """Copy the FAQ embeddings into a scratch table with the given layout and index it like faqs would be."""
+
+    target = f"{storage}({dimensions})"
+    if dimensions == source_dimensions:
+        expression = f"embedding::{target}"
+    else:
+        expression = f"l2_normalize(subvector(embedding::vector, 1, {dimensions}))::{target}"
+
+    started = time.perf_counter()
+    async with get_async_engine().begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+        await conn.execute(text(f"CREATE TABLE {BENCH_TABLE} (id integer PRIMARY KEY, embedding {target})"))
+        await conn.execute(text(
+            f"INSERT INTO {BENCH_TABLE} SELECT id, {expression} FROM faqs WHERE embedding IS NOT NULL"
+        ))
+        index_options = f"WITH (m = {int(settings.hnsw_m)}, ef_construction = {int(settings.hnsw_ef_construction)})"
+        if binary:
+            await conn.execute(text(
+                f"CREATE INDEX ON {BENCH_TABLE} USING hnsw ((binary_quantize(embedding)::bit({dimensions})) bit_hamming_ops) "
+                f"{index_options}"
+            ))
+        else:
+            await conn.execute(text(f"CREATE INDEX ON {BENCH_TABLE} USING hnsw (embedding {storage}_l2_ops) {index_options}"))
+        await conn.execute(text(f"ANALYZE {BENCH_TABLE}"))
+        table_bytes = await conn.scalar(text(f"SELECT pg_table_size('{BENCH_TABLE}')"))
+        index_bytes = await conn.scalar(text(f"SELECT pg_indexes_size('{BENCH_TABLE}')"))
+    return {"table_bytes": table_bytes, "index_bytes": index_bytes, "build_seconds": time.perf_counter() - started}
+
+
+def layout_query(storage: str, dimensions: int, binary: bool, candidates: int) -> str:
+    target = f"{storage}({dimensions})"
+    if not binary:
+        return f"SELECT id FROM {BENCH_TABLE} ORDER BY embedding <-> CAST(:embedding AS {target}) LIMIT :k"
+    bits = f"bit({dimensions})"
+    return f"""
+        SELECT id FROM (
+            SELECT id, embedding FROM {BENCH_TABLE}
+            ORDER BY binary_quantize(embedding)::{bits} <~> binary_quantize(CAST(:embedding AS {target}))::{bits}
+            LIMIT {candidates}
+        ) candidates
+        ORDER BY embedding <-> CAST(:embedding AS {target})
+        LIMIT :k
+    """
+
+
+async def benchmark(layouts: list[str], queries: int, k: int, noise: float, candidates: int):
+    source_storage, source_dimensions = await source_layout()
+    vectors = await sample_queries(queries, noise)
+    if not vectors:
+        print("No FAQ embeddings found. Seed the database first.")
+        return
+    truth = [await exact_search(v, k) for v in vectors]
+    ef_search = max(settings.hnsw_ef_search, candidates)
+
+    print(f"Current layout: {source_storage}({source_dimensions}), queries: {len(vectors)}, k: {k}, "
+          f"binary candidates: {candidates}")
+    print(f"{'layout':>22} | {'table':>9} | {'index':>9} | {'build':>7} | recall@{k} | {'p50':>8} | {'p95':>8}")
+    try:
+        for layout in layouts:
+            spec, _, option = layout.partition("+")
+            storage, _, dimensions = spec.partition(":")
+            dimensions = int(dimensions or source_dimensions)
+            binary = option == "binary"
+            if dimensions > source_dimensions:
+                print(f"{layout:>22} | skipped: more dimensions than the stored embeddings")
+                continue
+
+            sizes = await build_layout(storage, dimensions, source_dimensions, binary)
+            sql = text(layout_query(storage, dimensions, binary, candidates))
+            hits = 0
+            latencies = []
+            for v, expected in zip(vectors, truth):
+                started = time.perf_counter()
+                async with get_session() as session:
+                    await session.execute(
+                        text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(ef_search)}
+                    )
+                    result = await session.execute(sql, {"embedding": project(v, dimensions).tolist(), "k": k})
+                    ids = {r[0] for r in result}
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len(ids & expected)
+            recall = hits / sum(len(t) for t in truth)
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(
+                f"{layout:>22} | {sizes['table_bytes'] / 2**20:6.1f} MiB | {sizes['index_bytes'] / 2**20:6.1f} MiB | "
+                f"{sizes['build_seconds']:5.1f} s | {recall:9.3f} | {p50:5.2f} ms | {p95:5.2f} ms"
+            )
+    finally:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare table/index size, search latency and recall of embedding storage layouts "
+                    "against exact search over the current faqs.embedding column."
+    )
+    parser.add_argument(
+        "--layouts",
+        default="vector:1536,halfvec:1536,halfvec:768,halfvec:512,vector:1536+binary,halfvec:1536+binary,halfvec:512+binary",
+        help="Comma-separated storage:dimensions, with +binary for the binary pre-filter with full-precision re-ranking",
+    )
+    parser.add_argument("--queries", type=int, default=200, help="Number of query vectors to sample")
+    parser.add_argument("-k", type=int, default=5, help="Number of neighbours to compare")
+    parser.add_argument("--noise", type=float, default=0.01, help="Gaussian noise added to sampled embeddings")
+    parser.add_argument("--candidates", type=int, default=settings.binary_prefilter_candidates,
+                        help="Candidates shortlisted by the binary pre-filter before re-ranking")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.layouts.split(","), args.queries, args.k, args.noise, args.candidates))
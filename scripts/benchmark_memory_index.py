@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+from sqlalchemy import select, text
+from app.database import DataconnectionFaq, Faq, dispose_engines, get_session
+from app.vector_index import InMemoryVectorIndex
+
+
+async def sample_queries(count: int, noise: float) -> list[list[float]]:
+    """Build query vectors by perturbing randomly sampled FAQ embeddings."""
+
+    async with get_session() as session:
+        result = await session.scalars(
+            select(Faq.embedding).where(Faq.embedding.is_not(None)).order_by(text("random()")).limit(count)
+        )
+        embeddings = [np.asarray(e, dtype=np.float32) for e in result]
+
+    rng = np.random.default_rng(42)
+    return [(e + rng.normal(0, noise, e.shape).astype(np.float32)).tolist() for e in embeddings]
+
+
+async def exact_search(query_embedding: list[float], k: int) -> list[int]:
+    """Ground truth: a sequential scan with index scans disabled."""
+
+    async with get_session() as session:
+        await session.execute(text("SET LOCAL enable_indexscan = off"))
+        result = await session.execute(
+            select(Faq.id).where(Faq.embedding.is_not(None)).order_by(Faq.embedding.l2_distance(query_embedding)).limit(k)
+        )
+        return [r[0] for r in result]
+
+
+async def benchmark(queries: int, k: int, noise: float):
+    vectors = await sample_queries(queries, noise)
+    if not vectors:
+        print("No FAQ embeddings found. Seed the database first.")
+        return
+    truth = [set(await exact_search(v, k)) for v in vectors]
+
+    backends = {"pgvector": lambda v: DataconnectionFaq.search_by_embedding(v, limit=k)}
+    for quantization in ("float32", "int8"):
+        index = InMemoryVectorIndex(quantization)
+        started = time.perf_counter()
+        await index.load()
+        stats = index.stats()
+        print(
+            f"Loaded {stats['size']} embeddings as {quantization} in {time.perf_counter() - started:.2f} s "
+            f"({stats['memory_bytes'] / 2**20:.1f} MiB allocated)"
+        )
+
+        async def search(v, index=index):
+            return index.search(v, limit=k)
+
+        backends[f"memory/{quantization}"] = search
+
+    print(f"Queries: {len(vectors)}, k: {k}")
+    for name, search in backends.items():
+        hits = 0
+        latencies = []
+        for v, expected in zip(vectors, truth):
+            started = time.perf_counter()
+            rows = await search(v)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len({r["id"] for r in rows} & expected)
+        recall = hits / sum(len(t) for t in truth)
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{name:>16} | recall@{k} {recall:.3f} | p50 {p50:8.3f} ms | p95 {p95:8.3f} ms")
+
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare search latency and recall of the in-memory FAQ index with pgvector.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query vectors to sample")
+    parser.add_argument("-k", type=int, default=5, help="Number of neighbours to compare")
+    parser.add_argument("--noise", type=float, default=0.01, help="Gaussian noise added to sampled embeddings")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.queries, args.k, args.noise))
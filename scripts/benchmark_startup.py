@@ -0,0 +1,172 @@
+import argparse
+import json
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_profile(module: str) -> dict:
+    """Import a module in a fresh interpreter with -X importtime and summarize where the time goes."""
+
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    total_us = 0
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    return {"total_ms": total_us / 1000, "packages_ms": {name: us / 1000 for name, us in packages.items()}}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def startup_times(timeout: float) -> dict:
+    """Start the API with uvicorn and time the first /health response and the first healthy (200) one."""
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first_response = healthy = None
+    try:
+        while time.perf_counter() - started < timeout and process.poll() is None:
+            try:
+                status = httpx.get(url, timeout=1).status_code
+            except httpx.HTTPError:
+                time.sleep(0.01)
+                continue
+            elapsed = time.perf_counter() - started
+            first_response = first_response or elapsed
+            if status == 200:
+                healthy = elapsed
+                break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "first_response_ms": first_response * 1000 if first_response else None,
+        "healthy_ms": healthy * 1000 if healthy else None,
+    }
+
+
+def median(values: list) -> float | None:
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def fmt(value: float | None) -> str:
+    return f"{value:8.1f} ms" if value is not None else "     n/a   "
+
+
+def run(args) -> dict:
+    results = {"imports": {}, "startup": None}
+    for module in args.modules.split(","):
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        packages = defaultdict(list)
+        for profile in profiles:
+            for name, ms in profile["packages_ms"].items():
+                packages[name].append(ms)
+        top = sorted(((name, statistics.median(ms)) for name, ms in packages.items()), key=lambda item: -item[1])
+        results["imports"][module] = {
+            "total_ms": median([p["total_ms"] for p in profiles]),
+            "packages_ms": dict(top[:args.top]),
+        }
+        print(f"import {module}: {fmt(results['imports'][module]['total_ms'])} (median of {args.runs})")
+        for name, ms in top[:args.top]:
+            print(f"    {name:<28} {ms:8.1f} ms")
+
+    if not args.skip_server:
+        runs = [startup_times(args.timeout) for _ in range(args.runs)]
+        results["startup"] = {
+            "first_response_ms": median([r["first_response_ms"] for r in runs]),
+            "healthy_ms": median([r["healthy_ms"] for r in runs]),
+        }
+        print(f"uvicorn start to first /health response: {fmt(results['startup']['first_response_ms'])}")
+        print(f"uvicorn start to first healthy response: {fmt(results['startup']['healthy_ms'])}")
+        if results["startup"]["healthy_ms"] is None:
+            print("    /health never returned 200: is the database reachable?")
+    return results
+
+
+def compare(results: dict, baseline_path: Path):
+    """Print cold-start changes relative to a previously saved run."""
+
+    baseline = json.loads(baseline_path.read_text())["results"]
+    print(f"\nCompared with {baseline_path.name}:")
+    rows = [(f"import {m}", r["total_ms"], baseline["imports"].get(m, {}).get("total_ms")) for m, r in results["imports"].items()]
+    if results["startup"] and baseline.get("startup"):
+        rows += [(f"startup {key}", results["startup"][key], baseline["startup"][key]) for key in ("first_response_ms", "healthy_ms")]
+    for name, value, previous in rows:
+        if value is not None and previous:
+            print(f"{name:>34} | {previous:8.1f} ms -> {value:8.1f} ms ({(value / previous - 1) * 100:+6.1f}%)")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    results = run(args)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now(timezone.utc)
+    path = RESULTS_DIR / f"{timestamp:%Y%m%dT%H%M%SZ}-startup-{args.label}.json"
+    path.write_text(json.dumps({
+        "label": args.label,
+        "timestamp": timestamp.isoformat(),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "compare"},
+        "results": results,
+    }, indent=2, default=str))
+    print(f"\nResults saved to {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure cold-start cost: module import time (-X importtime) and time from launching uvicorn "
+                    "to the first /health response and the first healthy one."
+    )
+    parser.add_argument("--modules", default="app.main,app.database,app.agent", help="Comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement; medians are reported")
+    parser.add_argument("--top", type=int, default=10, help="Top-level packages listed by import time")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the API to become healthy")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure imports")
+    parser.add_argument("--label", default="run", help="Name stored with the saved results")
+    parser.add_argument("--compare", type=Path, help="Saved startup results file to compare against")
+    args = parser.parse_args()
+
+    main(args)
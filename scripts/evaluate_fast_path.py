@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from app.intents import INTENT_RULES, IntentRouter
+
+
+# Labelled sample: the intent the fast path should answer, or None when the question needs the agent
+DEFAULT_SAMPLE = [
+    ("What plan am I on?", "subscription_plan"),
+    ("what's my subscription?", "subscription_plan"),
+    ("Which tier do I have?", "subscription_plan"),
+    ("Hi, what is my current plan please", "subscription_plan"),
+    ("Am I on the premium plan?", "subscription_plan"),
+    ("Can you tell me my subscription plan?", "subscription_plan"),
+    ("Is my account active?", "account_status"),
+    ("What's the status of my account?", "account_status"),
+    ("Is my account still working?", "account_status"),
+    ("account status", "account_status"),
+    ("Has my account been suspended?", "account_status"),
+    ("What plan am I on and how do I upgrade?", None),
+    ("How do I upgrade my plan?", None),
+    ("Why is my account suspended?", None),
+    ("How do I cancel my subscription?", None),
+    ("What is the refund policy?", None),
+    ("I was charged twice this month", None),
+    ("How do I reset my password?", None),
+    ("What does the enterprise plan include?", None),
+    ("My account status says inactive but I paid, what happened?", None),
+]
+
+
+def load_sample(path: Path | None) -> list[tuple[str, str | None]]:
+    """Read JSONL lines with `query` and `intent` (null for questions the agent should handle)."""
+
+    if path is None:
+        return DEFAULT_SAMPLE
+    with path.open(encoding="utf-8") as stream:
+        return [(record["query"], record.get("intent")) for record in map(json.loads, filter(str.strip, stream))]
+
+
+async def evaluate(sample: list[tuple[str, str | None]], mode: str, threshold: float, verbose: bool):
+    router = IntentRouter(mode, threshold)
+    correct = routed = routed_correct = 0
+    per_intent = {intent: {"expected": 0, "found": 0} for intent in INTENT_RULES}
+
+    for query, expected in sample:
+        predicted = await router.classify(query)
+        correct += predicted == expected
+        if predicted:
+            routed += 1
+            routed_correct += predicted == expected
+        if expected:
+            per_intent[expected]["expected"] += 1
+            per_intent[expected]["found"] += predicted == expected
+        if verbose and predicted != expected:
+            print(f"  expected {expected or 'agent'!s:>17}, got {predicted or 'agent'!s:>17}: {query}")
+
+    print(f"Mode: {mode}, labelled queries: {len(sample)}")
+    print(f"  fast-path rate   {routed / len(sample):.3f}")
+    print(f"  accuracy         {correct / len(sample):.3f}")
+    print(f"  precision        {routed_correct / routed if routed else 1.0:.3f}  (share of fast-path answers with the right intent)")
+    for intent, counts in per_intent.items():
+        if counts["expected"]:
+            print(f"  recall {intent:<18} {counts['found'] / counts['expected']:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the fast-path intent router's hit rate and accuracy on labelled questions.")
+    parser.add_argument("sample", type=Path, nargs="?", help="JSONL with `query` and `intent` (defaults to a built-in sample)")
+    parser.add_argument("--mode", choices=["rules", "embedding"], default="rules", help="'embedding' calls the embeddings API")
+    parser.add_argument("--threshold", type=float, default=0.88, help="Similarity threshold for the embedding classifier")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List misrouted questions")
+    args = parser.parse_args()
+
+    asyncio.run(evaluate(load_sample(args.sample), args.mode, args.threshold, args.verbose))
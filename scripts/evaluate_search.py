@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from app.agent import generate_embeddings
+from app.database import DataconnectionFaq, dispose_engines
+
+
+def load_dataset(path: Path) -> list[dict]:
+    """Read labelled queries: one JSON object per line with `query` and the expected `faq_id` or `question`."""
+
+    records = []
+    with path.open(encoding="utf-8") as stream:
+        for line in stream:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                if record.get("query") and (record.get("faq_id") or record.get("question")):
+                    records.append(record)
+    return records
+
+
+def is_expected(row: dict, record: dict) -> bool:
+    if record.get("faq_id"):
+        return row["id"] == int(record["faq_id"])
+    return row["question"] == record["question"]
+
+
+async def evaluate(path: Path, k: int, use_category: bool):
+    records = load_dataset(path)
+    if not records:
+        print("No labelled queries found.")
+        return
+
+    embeddings = await generate_embeddings([record["query"] for record in records])
+
+    modes = {
+        "vector": lambda record, embedding, category: DataconnectionFaq.search_by_embedding(embedding, limit=k, category=category),
+        "hybrid": lambda record, embedding, category: DataconnectionFaq.hybrid_search(
+            record["query"], embedding, limit=k, category=category
+        ),
+    }
+
+    print(f"Queries: {len(records)}, k: {k}, category filter: {'on' if use_category else 'off'}")
+    for name, search in modes.items():
+        hits_at_1 = hits_at_k = 0
+        reciprocal_ranks = 0.0
+        started = time.perf_counter()
+        for record, embedding in zip(records, embeddings):
+            category = record.get("category") if use_category else None
+            rows = await search(record, embedding, category)
+            rank = next((i for i, row in enumerate(rows, start=1) if is_expected(row, record)), None)
+            if rank:
+                hits_at_1 += rank == 1
+                hits_at_k += 1
+                reciprocal_ranks += 1 / rank
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(records)
+        print(
+            f"{name:>8} | hit@1 {hits_at_1 / len(records):.3f} | hit@{k} {hits_at_k / len(records):.3f} "
+            f"| MRR {reciprocal_ranks / len(records):.3f} | {elapsed_ms:8.2f} ms/query"
+        )
+
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare hit rates of vector-only and hybrid FAQ retrieval on labelled queries.")
+    parser.add_argument("dataset", type=Path, help="JSONL file with `query` and the expected `faq_id` or `question` (optional `category`)")
+    parser.add_argument("-k", type=int, default=5, help="Number of results to consider")
+    parser.add_argument("--use-category", action="store_true", help="Pre-filter each search by the record's `category`")
+    args = parser.parse_args()
+
+    asyncio.run(evaluate(args.dataset, args.k, args.use_category))
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+# Simulated upstream latency, set from the command line
+latency = {"chat_ms": 400.0, "embedding_ms": 50.0, "jitter_ms": 0.0}
+
+app = FastAPI(title="Fake OpenAI", description="OpenAI-compatible stand-in for load tests: chat completions with tool calls and embeddings.")
+
+
+async def simulate_latency(base_ms: float):
+    await asyncio.sleep(max(0.0, base_ms + random.uniform(-latency["jitter_ms"], latency["jitter_ms"])) / 1000)
+
+
+def fake_embedding(text: str, dimensions: int) -> list[float]:
+    """Deterministic unit vector per text, so repeated texts embed identically."""
+
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await simulate_latency(latency["embedding_ms"])
+    dimensions = body.get("dimensions") or 1536
+    tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model"),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(str(text), dimensions)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def plan_tool_call(body: dict) -> tuple[str, dict]:
+    """
+    Search the FAQ on the first turn, then return the structured result once a tool has answered.
+    Answers straight away when FAQ entries were already retrieved into the system prompt (pre-retrieval mode).
+    """
+
+    messages = body.get("messages", [])
+    tools = {tool["function"]["name"] for tool in body.get("tools", [])}
+    user_text = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), "") or ""
+    if isinstance(user_text, list):
+        user_text = " ".join(part.get("text", "") for part in user_text if isinstance(part, dict))
+
+    preretrieved = any(m.get("role") == "system" and "FAQ entries retrieved" in (m.get("content") or "") for m in messages)
+    if "faq_search" in tools and not preretrieved and not any(m.get("role") == "tool" for m in messages):
+        return "faq_search", {"queries": [user_text[:200]]}
+    return "final_result", {
+        "support_advice": f"Thanks for reaching out about: {user_text[:80]}. Here is what you can do next.",
+        "escalation_required": False,
+        "risk_level": 1,
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await simulate_latency(latency["chat_ms"])
+
+    name, arguments = plan_tool_call(body)
+    tool_call = {"id": f"call_{random.getrandbits(48):x}", "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+    prompt_tokens = len(json.dumps(body.get("messages", []))) // 4 + 1
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 40, "total_tokens": prompt_tokens + 40}
+    common = {"id": f"chatcmpl-{random.getrandbits(48):x}", "created": int(time.time()), "model": body.get("model")}
+
+    if not body.get("stream"):
+        return {
+            **common,
+            "object": "chat.completion",
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": None, "tool_calls": [tool_call]}, "finish_reason": "tool_calls"}
+            ],
+            "usage": usage,
+        }
+
+    async def chunks():
+        chunk = {**common, "object": "chat.completion.chunk"}
+        delta = {"role": "assistant", "tool_calls": [{"index": 0, **tool_call}]}
+        yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+        yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'tool_calls'}], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible stand-in with configurable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Latency of each chat completion")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Latency of each embeddings request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter added to every latency")
+    args = parser.parse_args()
+
+    latency.update(chat_ms=args.chat_latency_ms, embedding_ms=args.embedding_latency_ms, jitter_ms=args.jitter_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
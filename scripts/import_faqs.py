@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+from pathlib import Path
+from app.database import dispose_engines, ensure_tables_exist
+from app.ingest import import_faqs, iter_faq_records
+
+
+async def run_import(path: Path, format: str, batch_size: int):
+    if not await ensure_tables_exist():
+        raise SystemExit("Database schema is not ready, aborting import.")
+
+    progress = {}
+    with path.open(encoding="utf-8", newline="") as stream:
+        async for progress in import_faqs(iter_faq_records(stream, format), batch_size=batch_size):
+            print(
+                f"processed={progress['processed']} inserted={progress['inserted']} "
+                f"skipped={progress['skipped']} invalid={progress['invalid']}"
+            )
+    print(f"Import complete: {progress.get('inserted', 0)} FAQs inserted.")
+
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import FAQs from a JSONL or CSV file. Re-running an interrupted import skips rows already stored."
+    )
+    parser.add_argument("path", type=Path, help="JSONL or CSV file with question, answer and category fields")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Input format (defaults to the file extension)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Rows embedded and inserted per batch")
+    args = parser.parse_args()
+
+    format = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "jsonl")
+    asyncio.run(run_import(args.path, format, args.batch_size))
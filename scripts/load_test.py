@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+CATEGORIES = ["billing", "technical", "general"]
+PLANS = ["free", "basic", "premium", "enterprise"]
+QUESTIONS = [
+    "How do I reset my password?",
+    "What is the refund policy?",
+    "Can I upgrade my plan mid-cycle?",
+    "Why was my card declined with error E402?",
+    "How do I export my data?",
+    "Is my account active?",
+    "How do I cancel my subscription?",
+    "Where can I find my invoices?",
+]
+
+
+def build_request(scenario: str, rng: random.Random, users: int) -> tuple[str, str, dict | None]:
+    """Pick the method, path and body of the next request for a scenario."""
+
+    if scenario == "agent_query":
+        return "POST", "/agent/query", {"user_id": rng.randint(1, users), "query": rng.choice(QUESTIONS)}
+    if scenario == "agent_query_preretrieval":
+        body = {"user_id": rng.randint(1, users), "query": rng.choice(QUESTIONS), "preretrieval": True}
+        return "POST", "/agent/query", body
+    if scenario == "agent_stream":
+        return "POST", "/agent/query/stream", {"user_id": rng.randint(1, users), "query": rng.choice(QUESTIONS)}
+    if scenario == "faq_list":
+        return "GET", "/faq/?limit=100", None
+    if scenario == "faq_category":
+        return "GET", f"/faq/{rng.choice(CATEGORIES)}?limit=100", None
+    raise ValueError(f"Unknown scenario {scenario!r}")
+
+
+SCENARIOS = ["agent_query", "agent_query_preretrieval", "agent_stream", "faq_list", "faq_category"]
+
+
+async def seed(faqs: int, users: int):
+    """Add synthetic users and FAQs. Existing rows are kept and re-running with the same sizes is a no-op."""
+
+    from app.database import User, dispose_engines, ensure_tables_exist, get_session
+    from app.ingest import import_faqs
+
+    if not await ensure_tables_exist():
+        raise SystemExit("Database schema is not ready, aborting.")
+
+    async with get_session() as session:
+        for user_id in range(1, users + 1):
+            await session.merge(User(
+                user_id=user_id,
+                name=f"Load Test User {user_id}",
+                email=f"loadtest-{user_id}@example.com",
+                account_status="active" if user_id % 10 else "inactive",
+                subscription_plan=PLANS[user_id % len(PLANS)],
+            ))
+        await session.commit()
+
+    records = (
+        {
+            "question": f"{QUESTIONS[i % len(QUESTIONS)]} (variant {i})",
+            "answer": f"Synthetic answer {i} for load testing the FAQ search and listing endpoints.",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+        }
+        for i in range(faqs)
+    )
+    progress = {}
+    async for progress in import_faqs(records, batch_size=256):
+        pass
+    print(f"Seeded {users} users and {faqs} FAQs ({progress.get('inserted', 0)} new).")
+    await dispose_engines()
+
+
+async def run_level(client: httpx.AsyncClient, scenario: str, concurrency: int, duration: float, users: int) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds and summarize their latencies."""
+
+    latencies = []
+    statuses = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            method, path, body = build_request(scenario, rng, users)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            if response.status_code < 400:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": sum(statuses.values()),
+        "errors": sum(statuses.values()) - len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(np.mean(latencies)) if latencies else 0.0,
+        "statuses": dict(statuses),
+    }
+
+
+async def run_benchmark(args) -> list[dict]:
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for scenario in args.scenarios:
+            if args.warmup:
+                await run_level(client, scenario, min(args.concurrency), args.warmup, args.users)
+            for concurrency in args.concurrency:
+                result = await run_level(client, scenario, concurrency, args.duration, args.users)
+                results.append(result)
+                print(
+                    f"{scenario:>14} c={concurrency:<4} | {result['rps']:8.1f} req/s | p50 {result['p50_ms']:8.1f} ms "
+                    f"| p95 {result['p95_ms']:8.1f} ms | p99 {result['p99_ms']:8.1f} ms | errors {result['errors']}"
+                )
+    return results
+
+
+def compare(results: list[dict], baseline_path: Path):
+    """Print throughput and tail-latency changes relative to a previously saved run."""
+
+    baseline = {(r["scenario"], r["concurrency"]): r for r in json.loads(baseline_path.read_text())["results"]}
+    print(f"\nCompared with {baseline_path.name}:")
+    for result in results:
+        previous = baseline.get((result["scenario"], result["concurrency"]))
+        if not previous:
+            continue
+        rps_change = (result["rps"] / previous["rps"] - 1) * 100 if previous["rps"] else 0.0
+        p95_change = (result["p95_ms"] / previous["p95_ms"] - 1) * 100 if previous["p95_ms"] else 0.0
+        print(f"{result['scenario']:>14} c={result['concurrency']:<4} | req/s {rps_change:+6.1f}% | p95 {p95_change:+6.1f}%")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_postgres_container(port: int) -> str:
+    """Start a throwaway pgvector container and return its id."""
+
+    container = subprocess.run(
+        [
+            "docker", "run", "-d", "--rm", "-p", f"{port}:5432",
+            "-e", f"POSTGRES_USER={os.environ['POSTGRES_USER']}",
+            "-e", f"POSTGRES_PASSWORD={os.environ['POSTGRES_PASSWORD']}",
+            "-e", f"POSTGRES_DB={os.environ['POSTGRES_DB']}",
+            "pgvector/pgvector:pg16",
+        ],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    for _ in range(60):
+        ready = subprocess.run(
+            ["docker", "exec", container, "psql", "-U", os.environ["POSTGRES_USER"], "-d", os.environ["POSTGRES_DB"],
+             "-c", "CREATE EXTENSION IF NOT EXISTS vector"],
+            capture_output=True,
+        )
+        if ready.returncode == 0:
+            return container
+        time.sleep(1)
+    subprocess.run(["docker", "stop", container], capture_output=True)
+    raise SystemExit("Postgres container did not become ready.")
+
+
+def wait_until_healthy(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"{url} did not become healthy within {timeout:.0f} s.")
+
+
+def main(args):
+    processes = []
+    container = None
+    try:
+        if args.docker:
+            os.environ.update(POSTGRES_HOST="127.0.0.1", POSTGRES_PORT=str(args.docker_port))
+            os.environ.setdefault("POSTGRES_USER", "supportagent")
+            os.environ.setdefault("POSTGRES_PASSWORD", "password")
+            os.environ.setdefault("POSTGRES_DB", "supportagent")
+            container = start_postgres_container(args.docker_port)
+
+        if args.spawn:
+            processes.append(subprocess.Popen([
+                sys.executable, str(ROOT / "scripts" / "fake_openai.py"), "--port", str(args.fake_openai_port),
+                "--chat-latency-ms", str(args.chat_latency_ms),
+                "--embedding-latency-ms", str(args.embedding_latency_ms),
+                "--jitter-ms", str(args.jitter_ms),
+            ]))
+            os.environ.update(OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_openai_port}/v1", OPENAI_API_KEY="fake")
+            wait_until_healthy(f"http://127.0.0.1:{args.fake_openai_port}/docs")
+
+        if args.seed:
+            asyncio.run(seed(args.faqs, args.users))
+
+        if args.spawn:
+            port = httpx.URL(args.base_url).port or 80
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=ROOT,
+            ))
+            wait_until_healthy(f"{args.base_url}/health")
+
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        if container:
+            subprocess.run(["docker", "stop", container], capture_output=True)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now(timezone.utc)
+    path = RESULTS_DIR / f"{timestamp:%Y%m%dT%H%M%SZ}-{args.label}.json"
+    path.write_text(json.dumps({
+        "label": args.label,
+        "timestamp": timestamp.isoformat(),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "compare"},
+        "results": results,
+    }, indent=2, default=str))
+    print(f"\nResults saved to {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load test /agent/query and /faq/* and report p50/p95/p99 latency and throughput per concurrency level."
+    )
+    parser.add_argument("--base-url", default="http://127.0.0.1:8080", help="API under test")
+    parser.add_argument("--scenarios", default="agent_query,faq_list,faq_category", help=f"Comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=3, help="Warm-up seconds per scenario, not recorded")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", action="store_true", help="Add synthetic users and FAQs before the run")
+    parser.add_argument("--faqs", type=int, default=1000, help="Synthetic FAQs to seed")
+    parser.add_argument("--users", type=int, default=100, help="Users to seed and query as (ids 1..N)")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake OpenAI server and the API locally")
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes when spawning")
+    parser.add_argument("--fake-openai-port", type=int, default=8099)
+    parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="Fake chat completion latency")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Fake embeddings latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Fake latency jitter")
+    parser.add_argument("--docker", action="store_true", help="Run against a throwaway pgvector container")
+    parser.add_argument("--docker-port", type=int, default=55432)
+    parser.add_argument("--label", default="run", help="Name stored with the saved results")
+    parser.add_argument("--compare", type=Path, help="Saved results file to compare against")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios.split(",")
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario!r}")
+
+    main(args)
@@ -1,12 +1,15 @@
 import asyncio
-import asyncio
-from app.database import SessionLocal, engine, Base, User, Faq
-from app.agent import generate_embedding
+from app.database import User, Faq, dispose_engines, ensure_tables_exist, faq_content_hash, sync_session
+from app.agent import generate_embeddings
 
 async def seed_database():
-    session = SessionLocal()
+    session = sync_session()
     
     try:
+        # The API only bootstraps the schema at startup, so make sure it exists here too
+        if not await ensure_tables_exist():
+            raise RuntimeError("Database schema is not ready")
+        
         # Clear existing data and seed users
         print("Clearing existing data...")
         session.query(Faq).delete()
@@ -88,17 +91,19 @@ async def seed_database():
             }
         ]
         
+        # Generate embeddings for the combined question and answer in batched API calls
+        embeddings = await generate_embeddings(
+            [f"{faq_item['question']}\n{faq_item['answer']}" for faq_item in faq_data]
+        )
+        
         faqs = []
-        for faq_item in faq_data:
-            # Generate embedding for the combined question and answer
-            text_for_embedding = f"{faq_item['question']} {faq_item['answer']}"
-            embedding = await generate_embedding(text_for_embedding)
-            
+        for faq_item, embedding in zip(faq_data, embeddings):
             faq = Faq(
                 question=faq_item['question'],
                 answer=faq_item['answer'],
                 category=faq_item['category'],
-                embedding=embedding
+                embedding=embedding,
+                embedding_hash=faq_content_hash(faq_item['question'], faq_item['answer'])
             )
             faqs.append(faq)
         
@@ -112,6 +117,7 @@ async def seed_database():
         raise
     finally:
         session.close()
+        await dispose_engines()
 
 
 if __name__ == "__main__":
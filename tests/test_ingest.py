@@ -0,0 +1,54 @@
+import io
+import unittest
+from unittest.mock import patch
+from app.ingest import import_faqs, iter_faq_records
+
+
+class IterFaqRecordsTest(unittest.TestCase):
+    def test_non_object_jsonl_lines_are_yielded_empty(self):
+        stream = io.StringIO(
+            '{"question": "Q1", "answer": "A1"}\n'
+            '[1, 2]\n'
+            '"text"\n'
+            '42\n'
+            'null\n'
+            '{not json\n'
+            '\n'
+            '{"question": "Q2", "answer": "A2", "category": "billing"}\n'
+        )
+
+        records = list(iter_faq_records(stream, "jsonl"))
+
+        self.assertEqual(records[0], {"question": "Q1", "answer": "A1"})
+        self.assertEqual(records[1:6], [{}] * 5)
+        self.assertEqual(records[6], {"question": "Q2", "answer": "A2", "category": "billing"})
+
+
+class ImportFaqsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_non_object_lines_count_as_invalid(self):
+        stream = io.StringIO('{"question": "Q1", "answer": "A1"}\n[1, 2]\n"text"\n42\nnull\n{"question": "Q2", "answer": "A2"}\n')
+        inserted = []
+
+        async def existing_content_hashes(hashes):
+            return set()
+
+        async def bulk_add_faqs(rows):
+            inserted.extend(rows)
+            return len(rows)
+
+        async def generate_embeddings(texts, cache=True):
+            return [[0.0, 1.0] for _ in texts]
+
+        with (
+            patch("app.ingest.DataconnectionFaq.existing_content_hashes", existing_content_hashes),
+            patch("app.ingest.DataconnectionFaq.bulk_add_faqs", bulk_add_faqs),
+            patch("app.ingest.generate_embeddings", generate_embeddings),
+        ):
+            reports = [report async for report in import_faqs(iter_faq_records(stream, "jsonl"), batch_size=3)]
+
+        self.assertEqual(reports[-1], {"processed": 6, "inserted": 2, "skipped": 0, "invalid": 4})
+        self.assertEqual([row["question"] for row in inserted], ["Q1", "Q2"])
+
+
+if __name__ == "__main__":
+    unittest.main()